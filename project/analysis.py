@@ -1,19 +1,36 @@
 import os 
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 import pandas as pd
+import shapely
 
 import matplotlib.pyplot as plt
 import seaborn as sns
 from shapely.geometry import Polygon
+from shapely.geometry.polygon import orient
 from matplotlib.lines import Line2D
+from matplotlib.path import Path
+from matplotlib.collections import LineCollection, PathCollection
+from matplotlib.colors import Normalize
+from matplotlib.ticker import MaxNLocator
+from matplotlib.cm import ScalarMappable
+from matplotlib.animation import FuncAnimation, PillowWriter
 
-from typing import Tuple
+from typing import List, Tuple
+
+from store import PanelStore
 
 ROOT_DIR = os.path.join("..", "data")
 
 
 class Analysis:
+    # Levels of detail of the map geometries, as simplification tolerance in degrees
+    SIMPLIFY_TOLERANCES = [0.0, 0.01, 0.05, 0.1, 0.25]
+
+    # Simplifying the borders shared by neighbouring countries only once requires shapely >= 2.1
+    COVERAGE_SIMPLIFY = hasattr(shapely, "coverage_simplify")
+
     def __init__(self, data: pd.DataFrame) -> None:
         iso2_to_iso3_europe = {
             "AL": "ALB", "AD": "AND", "AT": "AUT", "BY": "BLR", 
@@ -44,6 +61,10 @@ class Analysis:
             "MTOE": "Million Tonnes of Oil Equivalent per GDP",
         }
 
+    @classmethod
+    def from_store(cls, store_path: str) -> "Analysis":
+        # Faster than parsing the CSV, but the frame and the GeoDataFrame are private copies of the store
+        return cls(PanelStore(store_path).to_frame())
 
     def __create_plot_folder(self) -> None:
         if not os.path.exists(self.PLOT_ROOT_DIR):
@@ -88,55 +109,233 @@ class Analysis:
         })
 
         self.europe = europe
+
+    def _country_lines(self, column: str, countries: List[str] = None) -> Tuple[List[str], np.ndarray]:
+        '''
+        Pivots the long frame into a country x year array and returns one line per country
+        as an array of shape (countries, years, 2), which can be passed to a LineCollection.
+        '''
+        pivot_table = self.europe.pivot(index="COUNTRY", columns="TIME_PERIOD", values=column)
+
+        if countries is not None:
+            unknown = [country for country in countries if country not in pivot_table.index]
+            if unknown:
+                raise ValueError(f"Countries {unknown} not in the dataframe")
+            pivot_table = pivot_table.loc[countries]
+
+        years = pivot_table.columns.to_numpy(dtype=float)
+        values = pivot_table.to_numpy(dtype=float)
+        segments = np.stack([np.broadcast_to(years, values.shape), values], axis=-1)
+
+        return pivot_table.index.tolist(), segments
+
+    def _add_country_lines(self, ax: plt.Axes, column: str, color: str = None, alpha: float = 0.6) -> LineCollection:
+        # All countries are drawn as a single artist instead of one zig-zag line over the long frame
+        _, segments = self._country_lines(column)
+
+        collection = LineCollection(segments, colors=color if color else "tab:blue", alpha=alpha)
+        ax.add_collection(collection)
+        ax.autoscale_view()
+
+        return collection
+
+    def _simplified_geometries(self, tolerance: float) -> gpd.GeoSeries:
+        '''
+        One geometry per country at the given level of detail. The countries are simplified as a
+        coverage: every shared border is simplified once and used by both neighbours, so that no
+        gaps or overlaps appear between them. With shapely < 2.1 every country is simplified on its
+        own (topology-preserving Douglas-Peucker), then neighbouring borders can diverge by up to
+        twice the tolerance, which _choose_tolerance keeps below one pixel.
+        '''
+        geometries = self.europe.drop_duplicates("COUNTRY").geometry
+
+        if tolerance == 0:
+            return geometries
+        if self.COVERAGE_SIMPLIFY:
+            simplified = shapely.coverage_simplify(np.asarray(geometries), tolerance)
+            return gpd.GeoSeries(simplified, index=geometries.index, crs=geometries.crs)
+
+        return geometries.simplify(tolerance, preserve_topology=True)
+
+    def _country_paths(self, tolerance: float = 0.0) -> Tuple[List[str], List[Path]]:
+        # Converted to matplotlib paths once per level of detail, the paths are reused for every map
+        if not hasattr(self, "_paths"):
+            self._paths = {}
+
+        if tolerance not in self._paths:
+            self._paths[tolerance] = (
+                self.europe.drop_duplicates("COUNTRY")["COUNTRY"].tolist(),
+                [self._geometry_to_path(geometry) for geometry in self._simplified_geometries(tolerance)]
+            )
+
+        return self._paths[tolerance]
+
+    def _choose_tolerance(self, ax: plt.Axes) -> float:
+        # Coarsest level of detail whose tolerance is still below the size of one pixel of the axes
+        if not hasattr(self, "_bounds"):
+            self._bounds = self.europe.drop_duplicates("COUNTRY").total_bounds
+
+        min_x, min_y, max_x, max_y = self._bounds
+        extent = ax.get_window_extent()
+        degrees_per_pixel = max((max_x - min_x) / extent.width, (max_y - min_y) / extent.height)
+
+        # Countries simplified on their own can leave slivers of twice the tolerance between neighbours
+        max_tolerance = degrees_per_pixel if self.COVERAGE_SIMPLIFY else degrees_per_pixel / 2
+
+        return max(tolerance for tolerance in self.SIMPLIFY_TOLERANCES if tolerance <= max_tolerance)
+
+    def _map_collection(self, ax: plt.Axes, cmap: str, norm: Normalize) -> PathCollection:
+        # Boundary and fill are drawn by the same collection, at the level of detail fitting the axes
+        _, paths = self._country_paths(self._choose_tolerance(ax))
+
+        cmap = plt.get_cmap(cmap).with_extremes(bad="lightgrey")
+        collection = PathCollection(paths, cmap=cmap, norm=norm, edgecolors="black", linewidths=0.5)
+        ax.add_collection(collection)
+
+        ax.autoscale_view()
+        ax.set_aspect("equal")
+        ax.set_xticks([])
+        ax.set_yticks([])
+
+        return collection
+
+    @staticmethod
+    def _geometry_to_path(geometry) -> Path:
+        polygons = geometry.geoms if hasattr(geometry, "geoms") else [geometry]
+
+        # Matplotlib fills with the nonzero rule, holes are only left out when they run opposite to the exterior
+        rings = []
+        for polygon in map(orient, polygons):
+            rings.append(polygon.exterior)
+            rings.extend(polygon.interiors)
+
+        return Path.make_compound_path(
+            *[Path(np.asarray(ring.coords)[:, :2], closed=True) for ring in rings])
     
+    def _map_plot_values(self, column: str, average: bool, year: int = None) -> Tuple[np.ndarray, str]:
+        if column not in self.europe.columns:
+            raise ValueError(f"Column {column} not in the dataframe")
+
+        if average and year is not None:
+            raise ValueError("A year can only be selected with average=False, the average map covers all years")
+
+        # Values in the order of the country paths, no merge with the geometries needed
+        names = self.europe.drop_duplicates("COUNTRY")["COUNTRY"].tolist()
+
+        if average:
+            values = self.europe.groupby("COUNTRY")[column].mean().reindex(names)
+
+            if column == "CHANGE_INDICATOR":
+                title = "Average temperature increase (℃)"
+            else:
+                title = f"Average {self.column_name_to_title_description[column]} (2000 - 2022)"
+        else:
+            # Without a year the latest one is shown
+            year = year if year is not None else self.europe["TIME_PERIOD"].max()
+            if year not in set(self.europe["TIME_PERIOD"]):
+                raise ValueError(f"Year {year} not in the dataframe")
+
+            values = self.europe[self.europe["TIME_PERIOD"] == year].set_index("COUNTRY")[column].reindex(names)
+            title = f"{self.column_name_to_title_description[column]} ({year})"
+
+        return values.to_numpy(dtype=float), title
+
     def create_map_plot(
             self, 
             column: str, 
             average: bool = True,
             title_fontsize: int = 20,
-            colorbar_fontsize: int = 15
+            colorbar_fontsize: int = 15,
+            year: int = None,
+            save: bool = True
             ) -> None:
 
-        if column not in self.europe.columns:
-            raise ValueError(f"Column {column} not in the dataframe")        
+        values, title = self._map_plot_values(column, average, year)
 
         fig, ax = plt.subplots(1, 1, figsize=(20, 10)) 
 
-        if average:
-            average_data = self.europe.groupby("COUNTRY")[column].mean().reset_index()
-            europe_avg =self.europe.drop_duplicates("COUNTRY").merge(
-                average_data, on="COUNTRY", suffixes=("", "_avg"))
-
-            europe_avg.boundary.plot(ax=ax, color="black")
-            europe_avg.plot(column=column+"_avg", ax=ax, legend=True, cmap="Reds")
+        collection = self._map_collection(ax, "Reds", Normalize(vmin=np.nanmin(values), vmax=np.nanmax(values)))
+        collection.set_array(values)
 
-            if column == "CHANGE_INDICATOR":
-                plt.title("Average temperature increase (℃)", fontsize=title_fontsize)
-            else:
-                plt.title(f"Average {self.column_name_to_title_description[column]} (2000 - 2022)")
-            
-            cbar = ax.get_figure().get_axes()[1] 
-            cbar.tick_params(labelsize=colorbar_fontsize)
-
-        else:
-            self.europe.boundary.plot(ax=ax, color="black")
-            self.europe.plot(column=column, ax=ax, legend=True, cmap="Reds")
-            plt.title(self.column_name_to_title_description[column])
-        
-        # Removing numbers from the axis
-        plt.xticks([])
-        plt.yticks([])
+        cbar = fig.colorbar(collection, ax=ax)
+        cbar.ax.tick_params(labelsize=colorbar_fontsize)
 
+        plt.title(title, fontsize=title_fontsize)
         plt.tight_layout()
         
-        save_path = os.path.join(self.PLOT_ROOT_DIR, column + "_map.png")
-        plt.savefig(save_path)
-        plt.show()
+        # Without saving, the figure is left open for the caller (the server renders it into memory)
+        if save:
+            save_path = os.path.join(self.PLOT_ROOT_DIR, column + "_map.png")
+            plt.savefig(save_path)
+            plt.show()
+
+    def create_map_plots(
+            self,
+            columns: List[str],
+            average: bool = True,
+            years: List[int] = None,
+            title_fontsize: int = 20,
+            colorbar_fontsize: int = 15
+            ) -> List[str]:
+
+        '''
+        Batch version of create_map_plot for several columns and (with average=False) years.
+        The figure and the path collection are created once, every map only updates the face
+        colors, the color limits and the title before it is saved.
+        '''
+        # Checked before anything is drawn, so that no partial set of maps is written
+        if len(columns) == 0:
+            raise ValueError("No columns selected for the maps")
+
+        unknown = [column for column in columns if column not in self.europe.columns]
+        if unknown:
+            raise ValueError(f"Columns {unknown} not in the dataframe")
+
+        if average and years is not None:
+            raise ValueError("Years can only be selected with average=False, the average map covers all years")
+        if years is None:
+            years = [None]
+        elif len(years) == 0:
+            raise ValueError("No years selected for the maps")
+
+        unknown = [year for year in years if year is not None and year not in set(self.europe["TIME_PERIOD"])]
+        if unknown:
+            raise ValueError(f"Years {unknown} not in the dataframe")
+
+        fig, ax = plt.subplots(1, 1, figsize=(20, 10))
+        collection = self._map_collection(ax, "Reds", Normalize(vmin=0, vmax=1))
+
+        cbar = fig.colorbar(collection, ax=ax)
+        cbar.ax.tick_params(labelsize=colorbar_fontsize)
+
+        # The layout is computed once, with the title of the first map
+        _, first_title = self._map_plot_values(columns[0], average, years[0])
+        title = ax.set_title(first_title, fontsize=title_fontsize)
+        fig.tight_layout()
+
+        save_paths = []
+        for column in columns:
+            for year in years:
+                values, text = self._map_plot_values(column, average, year)
+
+                collection.set_array(values)
+                collection.set_clim(np.nanmin(values), np.nanmax(values))
+                title.set_text(text)
+
+                fname = column + "_map.png" if year is None else f"{column}_{year}_map.png"
+                save_path = os.path.join(self.PLOT_ROOT_DIR, fname)
+                fig.savefig(save_path)
+                save_paths.append(save_path)
+
+        plt.close(fig)
+
+        return save_paths
 
     def create_heatmap(
             self, 
             column: str, 
-            cmap: str
+            cmap: str,
+            save: bool = True
             ) -> None:
 
         if column not in self.europe.columns:
@@ -150,10 +349,11 @@ class Analysis:
         plt.ylabel("Country")
         plt.xlabel("Year")
 
-        save_path = os.path.join(self.PLOT_ROOT_DIR, column + "_heatmap.png")
-        plt.savefig(save_path)
-        plt.tight_layout()  
-        plt.show()
+        if save:
+            save_path = os.path.join(self.PLOT_ROOT_DIR, column + "_heatmap.png")
+            plt.savefig(save_path)
+            plt.tight_layout()  
+            plt.show()
         
     def create_lineplot(
             self, 
@@ -164,7 +364,8 @@ class Analysis:
             xlim: Tuple[int, int] = None,
             title_fontsize: int = 20,
             label_fontsize: int = 15, 
-            annot_fontsize: int = 15
+            annot_fontsize: int = 15,
+            save: bool = True
             ) -> None:
 
         if column not in self.europe.columns:
@@ -192,7 +393,7 @@ class Analysis:
                 )
 
         else:
-            self.europe.plot(x="TIME_PERIOD", y=column, legend=False)
+            self._add_country_lines(plt.gca(), column)
             plt.title(self.column_name_to_title_description[column])
 
         if ylim:
@@ -212,16 +413,18 @@ class Analysis:
         plt.yticks(fontsize=annot_fontsize)
         plt.xticks(fontsize=annot_fontsize)
 
-        save_path = os.path.join(self.PLOT_ROOT_DIR, column + "_lineplot.png")
-        plt.savefig(save_path)
+        if save:
+            save_path = os.path.join(self.PLOT_ROOT_DIR, column + "_lineplot.png")
+            plt.savefig(save_path)
 
-        plt.show()
+            plt.show()
 
     def create_scatterplot(
             self,
             column_x: str, 
             column_y: str, 
-            average: bool = False
+            average: bool = False,
+            save: bool = True
             ) -> None:
         
         if column_x not in self.europe.columns:
@@ -244,16 +447,18 @@ class Analysis:
         plt.xlabel(self.column_name_to_title_description[column_x])
         plt.ylabel(self.column_name_to_title_description[column_y])
 
-        save_path = os.path.join(self.PLOT_ROOT_DIR, column_x + "_" + column_y + "_scatterplot.png")
-        plt.savefig(save_path)
+        if save:
+            save_path = os.path.join(self.PLOT_ROOT_DIR, column_x + "_" + column_y + "_scatterplot.png")
+            plt.savefig(save_path)
 
-        plt.show()
+            plt.show()
 
     def create_correlation_plot(
             self, 
             method: str = "spearman",
             label_fontsize: int = 15, 
-            annot_fontsize: int = 10
+            annot_fontsize: int = 10,
+            save: bool = True
             ) -> None:
 
         plt.figure(figsize=(12, 10))
@@ -274,9 +479,10 @@ class Analysis:
         cbar = plt.gcf().axes[1]
         cbar.tick_params(labelsize=label_fontsize)
 
-        save_path = os.path.join(self.PLOT_ROOT_DIR, f"{method}_correlation_plot.png")
-        plt.savefig(save_path)
-        plt.show()
+        if save:
+            save_path = os.path.join(self.PLOT_ROOT_DIR, f"{method}_correlation_plot.png")
+            plt.savefig(save_path)
+            plt.show()
 
     def twinx_scatterplot(
             self, 
@@ -286,7 +492,8 @@ class Analysis:
             title_fontsize: int = 20,
             label_fontsize: int = 15,
             tick_fontsize: int = 10,
-            s: int = 40
+            s: int = 40,
+            save: bool = True
             ) -> None:
 
         if column_1 not in self.europe.columns:
@@ -325,18 +532,21 @@ class Analysis:
             ax2.tick_params(axis="both", which="major", labelsize=tick_fontsize)
             
         else:
-            self.europe.plot(x="TIME_PERIOD", y=column_1, legend=False)
-            plt.title(self.column_name_to_title_description[column_1])
+            self._add_country_lines(ax1, column_1, color="blue")
+            ax1.set_ylabel(column_1, fontsize=label_fontsize)
 
             ax2 = ax1.twinx()
-            self.europe.plot(x="TIME_PERIOD", y=column_2, legend=False, ax=ax2, color="red")
-            plt.title(self.column_name_to_title_description[column_2])
+            self._add_country_lines(ax2, column_2, color="red")
+            ax2.set_ylabel(column_2, fontsize=label_fontsize)
+
+            plt.title(f"{self.column_name_to_title_description[column_1]} and {self.column_name_to_title_description[column_2]}", fontsize=title_fontsize)
 
         
-        save_path = os.path.join(self.PLOT_ROOT_DIR, column_1 + "_" + column_2 + "_scatter_twinx_plot.png")
-        plt.savefig(save_path)
+        if save:
+            save_path = os.path.join(self.PLOT_ROOT_DIR, column_1 + "_" + column_2 + "_scatter_twinx_plot.png")
+            plt.savefig(save_path)
 
-        plt.show()
+            plt.show()
     
 
     def twinx_lineplot(
@@ -346,7 +556,8 @@ class Analysis:
                 average: bool = True,
                 title_fontsize: int = 20,
                 label_fontsize: int = 15,
-                tick_fontsize: int = 10
+                tick_fontsize: int = 10,
+                save: bool = True
                 ) -> None:
 
             if column_1 not in self.europe.columns:
@@ -385,25 +596,227 @@ class Analysis:
                 ax2.tick_params(axis="both", which="major", labelsize=tick_fontsize)
 
             else:
-                self.europe.plot(x="TIME_PERIOD", y=column_1, legend=False)
-                plt.title(self.column_name_to_title_description[column_1])
+                self._add_country_lines(ax1, column_1, color="blue")
+                ax1.set_ylabel(column_1, fontsize=label_fontsize)
 
                 ax2 = ax1.twinx()
-                self.europe.plot(x="TIME_PERIOD", y=column_2, legend=False, ax=ax2, color="red")
-                plt.title(self.column_name_to_title_description[column_2])
+                self._add_country_lines(ax2, column_2, color="red")
+                ax2.set_ylabel(column_2, fontsize=label_fontsize)
+
+                plt.title(f"{self.column_name_to_title_description[column_1]} and {self.column_name_to_title_description[column_2]}", fontsize=title_fontsize)
 
             
-            save_path = os.path.join(self.PLOT_ROOT_DIR, column_1 + "_" + column_2 + "_line_twinx_plot.png")
-            plt.savefig(save_path)
+            if save:
+                save_path = os.path.join(self.PLOT_ROOT_DIR, column_1 + "_" + column_2 + "_line_twinx_plot.png")
+                plt.savefig(save_path)
+
+                plt.show()
+
+    @staticmethod
+    def _render_line_background(
+            segments: np.ndarray,
+            xlim: Tuple[float, float],
+            ylim: Tuple[float, float],
+            extent,
+            dpi: float
+            ) -> np.ndarray:
+
+        # Drawing all lines once into a transparent image of the size of one panel
+        fig = plt.figure(figsize=(extent.width / dpi, extent.height / dpi), dpi=dpi)
+        fig.patch.set_alpha(0)
+
+        ax = fig.add_axes([0, 0, 1, 1])
+        ax.set_axis_off()
+        ax.set_xlim(xlim)
+        ax.set_ylim(ylim)
+        ax.add_collection(LineCollection(segments, colors="lightgrey", linewidths=0.8))
+
+        fig.canvas.draw()
+        background = np.asarray(fig.canvas.buffer_rgba()).copy()
+        plt.close(fig)
+
+        return background
+
+    def create_small_multiples(
+            self,
+            column: str,
+            countries: List[str] = None,
+            nrows: int = 4,
+            ncols: int = 5,
+            context: bool = True,
+            title_fontsize: int = 20,
+            label_fontsize: int = 10
+            ) -> List[str]:
 
-            plt.show()
+        if column not in self.europe.columns:
+            raise ValueError(f"Column {column} not in the dataframe")
+
+        names, segments = self._country_lines(column, countries)
+        if not names:
+            raise ValueError("No countries selected for the small multiples")
+
+        # The context shows all countries, also when only some of them get a panel
+        context_segments = self._country_lines(column)[1] if context else segments
+
+        '''
+        One panel per country, split into pages of nrows x ncols panels. Every panel holds a single
+        LineCollection with the line of its country, taken from the pivoted array. All countries are
+        shown in grey as context; this background is rasterized once at the panel size and shared
+        by all panels as an image. The figure, the axes and the collections are created once and
+        only get new segments and titles for every page. Limits and ticks are fixed, so that they
+        are not recomputed for every panel.
+        '''
+        n_countries = len(names)
+        ncols = min(ncols, n_countries)
+        nrows = min(nrows, int(np.ceil(n_countries / ncols)))
+        per_page = nrows * ncols
+
+        values = context_segments[:, :, 1]
+        xlim = (context_segments[:, :, 0].min(), context_segments[:, :, 0].max())
+        margin = 0.05 * (np.nanmax(values) - np.nanmin(values))
+        ylim = (np.nanmin(values) - margin, np.nanmax(values) + margin)
+
+        # Only ticks inside the limits, otherwise the labels of neighbouring panels overlap
+        xticks = [tick for tick in MaxNLocator(nbins=4, integer=True).tick_values(*xlim) if xlim[0] < tick < xlim[1]]
+        yticks = [tick for tick in MaxNLocator(nbins=4).tick_values(*ylim) if ylim[0] < tick < ylim[1]]
+
+        # Margins for the title and the tick labels in inches, so that they fit for any number of rows
+        fig, axes = plt.subplots(nrows, ncols, figsize=(4 * ncols, 3 * nrows), squeeze=False)
+        fig.subplots_adjust(left=0.05, right=0.98, bottom=0.4 / (3 * nrows), top=1 - 1.0 / (3 * nrows), wspace=0.1, hspace=0.35)
+        fig.suptitle(self.column_name_to_title_description[column], fontsize=title_fontsize)
+
+        if context:
+            background = self._render_line_background(context_segments, xlim, ylim, axes[0, 0].get_window_extent(), fig.dpi)
+
+        collections = []
+        for position, ax in enumerate(axes.flat):
+            if context:
+                ax.imshow(background, extent=(*xlim, *ylim), aspect="auto", interpolation="none", zorder=0)
+
+            collection = LineCollection([], colors="red", linewidths=2)
+            ax.add_collection(collection)
+            collections.append(collection)
+
+            ax.set_xlim(xlim)
+            ax.set_ylim(ylim)
+            ax.set_xticks(xticks)
+            ax.set_yticks(yticks)
+            ax.tick_params(labelsize=label_fontsize, labelleft=position % ncols == 0)
+            ax.grid(True)
+
+        save_paths = []
+        for page, start in enumerate(range(0, n_countries, per_page)):
+            for position, (ax, collection) in enumerate(zip(axes.flat, collections)):
+                idx = start + position
+                ax.set_visible(idx < n_countries)
+                if idx >= n_countries:
+                    continue
+
+                collection.set_segments([segments[idx]])
+                ax.set_title(names[idx], fontsize=label_fontsize)
+
+            save_path = os.path.join(self.PLOT_ROOT_DIR, f"{column}_small_multiples_{page + 1}.png")
+            fig.savefig(save_path)
+            save_paths.append(save_path)
+
+        plt.close(fig)
+
+        return save_paths
+
+    def _map_values(self, column: str, years: List[int] = None) -> Tuple[pd.DataFrame, Normalize]:
+        if column not in self.europe.columns:
+            raise ValueError(f"Column {column} not in the dataframe")
+
+        # One column per year, rows in the order of the country paths
+        names = self.europe.drop_duplicates("COUNTRY")["COUNTRY"].tolist()
+        pivot_table = self.europe.pivot(index="COUNTRY", columns="TIME_PERIOD", values=column).reindex(names)
+
+        if years is not None:
+            unknown = [year for year in years if year not in pivot_table.columns]
+            if unknown:
+                raise ValueError(f"Years {unknown} not in the dataframe")
+            pivot_table = pivot_table[years]
+
+        # Same color scale for all years, so that the maps are comparable
+        norm = Normalize(vmin=np.nanmin(pivot_table.to_numpy()), vmax=np.nanmax(pivot_table.to_numpy()))
+
+        return pivot_table, norm
+
+    def create_map_strip(
+            self,
+            column: str,
+            years: List[int] = None,
+            ncols: int = 6,
+            cmap: str = "Reds",
+            title_fontsize: int = 20
+            ) -> str:
+
+        pivot_table, norm = self._map_values(column, years)
+        years = pivot_table.columns.tolist()
+
+        ncols = min(ncols, len(years))
+        nrows = int(np.ceil(len(years) / ncols))
+        fig, axes = plt.subplots(nrows, ncols, figsize=(4 * ncols, 3.5 * nrows), squeeze=False)
+
+        for ax, year in zip(axes.flat, years):
+            collection = self._map_collection(ax, cmap, norm)
+            collection.set_array(pivot_table[year].to_numpy())
+            ax.set_title(str(year))
+
+        for ax in axes.flat[len(years):]:
+            ax.set_visible(False)
+
+        fig.colorbar(ScalarMappable(norm=norm, cmap=cmap), ax=axes, shrink=0.6)
+        fig.suptitle(self.column_name_to_title_description[column], fontsize=title_fontsize)
+
+        save_path = os.path.join(self.PLOT_ROOT_DIR, column + "_map_strip.png")
+        fig.savefig(save_path)
+        plt.close(fig)
+
+        return save_path
+
+    def create_map_animation(
+            self,
+            column: str,
+            years: List[int] = None,
+            cmap: str = "Reds",
+            fps: int = 2,
+            title_fontsize: int = 20
+            ) -> str:
+
+        pivot_table, norm = self._map_values(column, years)
+        years = pivot_table.columns.tolist()
+
+        fig, ax = plt.subplots(1, 1, figsize=(10, 8))
+        collection = self._map_collection(ax, cmap, norm)
+        fig.colorbar(collection, ax=ax, shrink=0.8)
+        title = ax.set_title("", fontsize=title_fontsize)
+
+        # The geometry is drawn from the same collection in every frame, only the colors change
+        def update(frame: int):
+            year = years[frame]
+            collection.set_array(pivot_table[year].to_numpy())
+            title.set_text(f"{self.column_name_to_title_description[column]} ({year})")
+            return collection, title
+
+        animation = FuncAnimation(fig, update, frames=len(years), blit=False)
+
+        save_path = os.path.join(self.PLOT_ROOT_DIR, column + "_map_animation.gif")
+        animation.save(save_path, writer=PillowWriter(fps=fps))
+        plt.close(fig)
+
+        return save_path
 
 
 if __name__ == "__main__":
     data_path = os.path.join(ROOT_DIR, "final_data.csv")
-    
-    data = pd.read_csv(data_path)
-    analysis = Analysis(data)
+    store_path = os.path.join(ROOT_DIR, "final_data_store")
+
+    if PanelStore(store_path).exists():
+        analysis = Analysis.from_store(store_path)
+    else:
+        data = pd.read_csv(data_path)
+        analysis = Analysis(data)
 
     analysis.create_map_plot(
         "CHANGE_INDICATOR", 
@@ -0,0 +1,67 @@
+import time
+import string
+import itertools
+import numpy as np
+import pandas as pd
+
+from functools import reduce
+from typing import List
+
+from preprocessing import DataPreprocesser
+
+'''
+Benchmark of the country-year join used in DataPreprocesser.get_final_data at world scale.
+Every indicator is stored in its own long frame (TIME_PERIOD, ISO2, value) with shuffled rows
+and a few missing country-years, similar to what the per-source readers return.
+The previous approach (chained pd.merge on object-dtype keys) is used as the reference.
+'''
+N_COUNTRIES = 250
+YEARS = list(range(1961, 2023))
+N_INDICATORS = 50
+REPEATS = 3
+
+
+def make_indicator_frames(n_countries: int, years: List[int], n_indicators: int, seed: int = 0) -> List[pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    countries = np.array(["".join(code) for code in itertools.product(string.ascii_uppercase, repeat=2)][:n_countries], dtype=object)
+
+    frames = []
+    for idx in range(n_indicators):
+        grid = pd.MultiIndex.from_product([countries, years], names=["ISO2", "TIME_PERIOD"]).to_frame(index=False)
+        grid[f"INDICATOR_{idx}"] = rng.normal(size=len(grid))
+
+        # Dropping some country-years and shuffling, so that the join has to align the keys
+        keep = rng.random(len(grid)) > 0.02
+        frames.append(grid[keep].sample(frac=1, random_state=idx)[["TIME_PERIOD", "ISO2", f"INDICATOR_{idx}"]])
+
+    return frames
+
+
+def merge_join(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    return reduce(lambda left, right: pd.merge(left, right, on=["ISO2", "TIME_PERIOD"], how="inner"), frames)
+
+
+def indexed_join(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    return DataPreprocesser.join_on_country_year(frames)
+
+
+def benchmark(func, frames: List[pd.DataFrame]) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(frames)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    frames = make_indicator_frames(N_COUNTRIES, YEARS, N_INDICATORS)
+    print(f"{N_COUNTRIES} countries, {len(YEARS)} years, {N_INDICATORS} indicators")
+
+    # Both joins have to produce the same panel
+    expected = merge_join(frames).sort_values(["ISO2", "TIME_PERIOD"]).reset_index(drop=True)
+    result = indexed_join(frames)
+    pd.testing.assert_frame_equal(result, expected[result.columns], check_dtype=False)
+
+    for name, func in [("pd.merge on object keys", merge_join), ("integer-coded key join", indexed_join)]:
+        print(f"{name}: {benchmark(func, frames):.3f}s")
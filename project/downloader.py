@@ -4,8 +4,8 @@ import requests
 
 
 class DataRetriever:
-    def __init__(self) -> None:
-        self.ROOT_DIR = os.path.join("..", "data")
+    def __init__(self, root_dir: str = None) -> None:
+        self.ROOT_DIR = root_dir if root_dir else os.path.join("..", "data")
 
     def download_kaggle_dataset(self, dataset_name: str) -> None:
         # Initiailze API. Make sure that API key is provided.
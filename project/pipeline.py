@@ -1,47 +1,209 @@
 import os
+import pandas as pd
+
+from typing import Dict, List
 
 from downloader import DataRetriever
 from preprocessing import DataPreprocesser
+from store import PanelStore
+from validation import DataValidator, ValidationReport
+from stages import Stage, StageRunner
+from pipeline_config import DEFAULT_CONFIG, PipelineConfig, Sink, Source
 
 
 class DataPipeline:
-    def __init__(self, save_path: str = None) -> None:
-        self.ROOT_DIR = os.path.join("..", "data")
+    '''
+    Builds the stages (download per source, validation, preprocessing, one stage per sink) from a
+    PipelineConfig and runs them with the StageRunner. Independent stages run concurrently and stages
+    whose inputs did not change since the last run are skipped. The downloads run on every run, since
+    the remote data can change at any time.
+    With a fixture directory, the sources are read from there and nothing is downloaded.
+    '''
+    READERS = ["kaggle", "eurostat"]
+
+    def __init__(self, save_path: str = None, config: PipelineConfig = None, fixture_dir: str = None) -> None:
+        self.config = config if config else DEFAULT_CONFIG
+        self.ROOT_DIR = self.config.data_dir
+        self.fixture_dir = fixture_dir if fixture_dir else self.config.fixture_dir
 
         if not os.path.exists(self.ROOT_DIR):
             os.makedirs(self.ROOT_DIR)
 
         if not save_path:
-            self.save_path = os.path.join(self.ROOT_DIR, "final_data.csv")
+            self.save_path = os.path.join(self.ROOT_DIR, self.config.output)
         else:
             self.save_path = save_path
 
-        self.kaggle = os.path.join(self.ROOT_DIR, "climate_change_indicators.csv")
-        self.eurostat = os.path.join(self.ROOT_DIR, "sdg_07_10_linear.csv")
+        # Additional sinks and the record of the last runs are placed next to the final data
+        output_dir = os.path.dirname(self.save_path)
+        self.sink_paths = {sink.name: os.path.join(output_dir, sink.fname) for sink in self.config.sinks}
+        self.state_path = os.path.splitext(self.save_path)[0] + "_state.json"
+        self.validation_path = os.path.splitext(self.save_path)[0] + "_validation.json"
+
+        self.source_paths = {source.name: self._source_path(source) for source in self.config.sources}
+
+        readers = self._check_readers()
+
+        self.kaggle = self.source_paths[readers["kaggle"].name]
+        self.eurostat = self.source_paths[readers["eurostat"].name]
+        self.kaggle_column = readers["kaggle"].columns[0]
+        self.eurostat_units = readers["eurostat"].columns
+
+
+    def _check_readers(self) -> Dict[str, Source]:
+        # DataPreprocesser combines exactly one source per reader, other configurations are rejected
+        readers = [source.reader for source in self.config.sources]
+
+        unknown = sorted(set(readers) - set(self.READERS))
+        if unknown:
+            raise ValueError(f"Unknown readers {unknown}, expected one of {self.READERS}")
+
+        duplicated = sorted({reader for reader in readers if readers.count(reader) > 1})
+        if duplicated:
+            raise ValueError(f"Only one source per reader is supported, got several for {duplicated}")
+
+        missing = [reader for reader in self.READERS if reader not in readers]
+        if missing:
+            raise ValueError(f"No source for readers {missing}")
+
+        sources = {source.reader: source for source in self.config.sources}
+        if len(sources["kaggle"].columns) != 1:
+            raise ValueError(f"The kaggle reader produces exactly one column, got {sources['kaggle'].columns}")
+
+        return sources
+
+
+    def _source_path(self, source: Source) -> str:
+        if not self.fixture_dir:
+            return os.path.join(self.ROOT_DIR, source.fname)
+
+        if not source.fixture:
+            raise ValueError(f"Source {source.name} has no fixture file")
+        return os.path.join(self.fixture_dir, source.fixture)
+
+
+    def download_source(self, source: Source) -> None:
+        data_retriever = DataRetriever(root_dir=self.ROOT_DIR)
+
+        if source.downloader == "kaggle":
+            data_retriever.download_kaggle_dataset(source.location)
+        elif source.downloader == "eurostat":
+            data_retriever.download_eurostat_data(source.location, source.fname)
+        else:
+            raise ValueError(f"Unknown downloader {source.downloader} for source {source.name}")
 
 
     def download_data(self):
-        data_retriever = DataRetriever()
-        data_retriever.download_kaggle_dataset('tarunrm09/climate-change-indicators')
-    
-        url = 'https://ec.europa.eu/eurostat/api/dissemination/sdmx/2.1/data/sdg_07_10/?format=SDMX-CSV&i'
-        data_retriever.download_eurostat_data(url, "sdg_07_10_linear.csv")
+        for source in self.config.sources:
+            self.download_source(source)
+
+
+    def validate_data(self) -> ValidationReport:
+        report = DataValidator(
+            kaggle_fpath=self.kaggle,
+            eurostat_fpath=self.eurostat,
+            eurostat_units=self.eurostat_units
+            ).validate()
+
+        # The report is saved in any case, so that the stats of a failed validation can be inspected
+        report.save(self.validation_path)
+        report.raise_for_errors()
+
+        return report
 
 
     def preprocess_data(self):
-        return DataPreprocesser(kaggle_fpath=self.kaggle, eurostat_fpath=self.eurostat).get_final_data()
+        # Checks that were already done by the validation stage are skipped, if it validated the current files
+        validated = ValidationReport.valid_for(self.validation_path, [self.kaggle, self.eurostat])
 
+        return DataPreprocesser(
+            kaggle_fpath=self.kaggle,
+            eurostat_fpath=self.eurostat,
+            eurostat_units=self.eurostat_units,
+            kaggle_column=self.kaggle_column,
+            validated=validated
+            ).get_final_data()
 
-    def run(self):
-        self.download_data()
-        preprocessed_data = self.preprocess_data()
-        print(preprocessed_data.head())
 
+    def _preprocess_stage(self) -> pd.DataFrame:
+        preprocessed_data = self.preprocess_data()
         preprocessed_data.to_csv(self.save_path, index=False)
+        return preprocessed_data
+
+
+    def _write_sink(self, sink: Sink) -> None:
+        data = pd.read_csv(self.save_path)
+        path = self.sink_paths[sink.name]
+
+        if sink.writer == "csv":
+            data.to_csv(path, index=False)
+        elif sink.writer == "store":
+            PanelStore(path).write(data)
+        else:
+            raise ValueError(f"Unknown writer {sink.writer} for sink {sink.name}")
+
+
+    def _sink_outputs(self, sink: Sink) -> List[str]:
+        path = self.sink_paths[sink.name]
+        if sink.writer == "store":
+            # The pointer to the current version is replaced last, after cube and index are written
+            return [PanelStore(path).current_path]
+        return [path]
+
+
+    def build_stages(self) -> List[Stage]:
+        stages = []
+
+        if not self.fixture_dir:
+            for source in self.config.sources:
+                stages.append(Stage(
+                    name=f"download_{source.name}",
+                    func=lambda source=source: self.download_source(source),
+                    outputs=[self.source_paths[source.name]],
+                    params={"downloader": source.downloader, "location": source.location},
+                    always_run=True,
+                ))
+
+        stages.append(Stage(
+            name="validate",
+            func=self.validate_data,
+            inputs=[self.kaggle, self.eurostat],
+            outputs=[self.validation_path],
+            params={"eurostat_units": self.eurostat_units},
+        ))
+
+        stages.append(Stage(
+            name="preprocess",
+            func=self._preprocess_stage,
+            inputs=[self.kaggle, self.eurostat, self.validation_path],
+            outputs=[self.save_path],
+            params={"eurostat_units": self.eurostat_units, "kaggle_column": self.kaggle_column},
+        ))
+
+        for sink in self.config.sinks:
+            stages.append(Stage(
+                name=f"sink_{sink.name}",
+                func=lambda sink=sink: self._write_sink(sink),
+                inputs=[self.save_path],
+                outputs=self._sink_outputs(sink),
+                params={"writer": sink.writer},
+            ))
+
+        return stages
+
+
+    def run(self, force: bool = False):
+        results = StageRunner(self.build_stages(), self.state_path).run(force=force)
+
+        preprocessed_data = results.get("preprocess")
+        if preprocessed_data is None:
+            preprocessed_data = pd.read_csv(self.save_path)
+
+        print(preprocessed_data.head())
 
         return preprocessed_data
 
 
 if __name__ == "__main__":
     pipeline = DataPipeline()
-    pipeline.run()
\ No newline at end of file
+    pipeline.run()
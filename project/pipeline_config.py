@@ -0,0 +1,74 @@
+import os
+
+from dataclasses import dataclass, field
+from typing import List
+
+
+@dataclass
+class Source:
+    '''
+    A raw input of the pipeline.
+    reader: Preprocessing method of DataPreprocesser the file is read with ("kaggle" or "eurostat").
+    downloader: Method of DataRetriever the file is obtained with ("kaggle" or "eurostat").
+    location: Kaggle dataset slug or Eurostat URL.
+    columns: Target columns the reader produces. For Eurostat these are the selected units, for Kaggle
+             the name of the single temperature change column.
+    fixture: File name inside the fixture directory, used instead of downloading for offline runs.
+    '''
+    name: str
+    fname: str
+    reader: str
+    downloader: str
+    location: str
+    columns: List[str]
+    fixture: str = None
+
+
+@dataclass
+class Sink:
+    '''
+    An additional output written from the final data ("csv" or "store").
+    '''
+    name: str
+    writer: str
+    fname: str
+
+
+@dataclass
+class PipelineConfig:
+    '''
+    Exactly one source per reader of DataPreprocesser (kaggle and eurostat) is expected.
+    '''
+    sources: List[Source]
+    output: str = "final_data.csv"
+    sinks: List[Sink] = field(default_factory=list)
+    data_dir: str = os.path.join("..", "data")
+    fixture_dir: str = None
+
+
+DEFAULT_CONFIG = PipelineConfig(
+    sources=[
+        Source(
+            name="kaggle",
+            fname="climate_change_indicators.csv",
+            reader="kaggle",
+            downloader="kaggle",
+            location="tarunrm09/climate-change-indicators",
+            columns=["CHANGE_INDICATOR"],
+            fixture="kaggle_sample.csv",
+        ),
+        Source(
+            name="eurostat",
+            fname="sdg_07_10_linear.csv",
+            reader="eurostat",
+            downloader="eurostat",
+            location="https://ec.europa.eu/eurostat/api/dissemination/sdmx/2.1/data/sdg_07_10/?format=SDMX-CSV&i",
+            columns=["MTOE", "TOE_HAB"],
+            fixture="eurostat_sample.csv",
+        ),
+    ],
+    output="final_data.csv",
+    sinks=[
+        Sink(name="store", writer="store", fname="final_data_store"),
+    ],
+)
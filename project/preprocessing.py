@@ -1,12 +1,26 @@
 import pandas as pd
 import numpy as np
 
+from functools import reduce
+from typing import List
+
 
 class DataPreprocesser:
-    def __init__(self, kaggle_fpath: str, eurostat_fpath: str) -> None:
+    def __init__(
+            self,
+            kaggle_fpath: str,
+            eurostat_fpath: str,
+            eurostat_units: List[str] = None,
+            kaggle_column: str = "CHANGE_INDICATOR",
+            validated: bool = False
+            ) -> None:
+
         self.kaggle_fpath = kaggle_fpath
         self.eurostat_fpath = eurostat_fpath
 
+        # Inputs that passed the DataValidator are not checked for unknown codes again
+        self.validated = validated
+
         self.code_mapping = {
             'AL': 'AL', 'AT': 'AT', 'BA': 'BA', 'BE': 'BE', 'BG': 'BG', 'CY': 'CY', 'CZ': 'CZ',
             'DE': 'DE', 'DK': 'DK', 'EE': 'EE', 'EL': 'GR', 'ES': 'ES', 'FI': 'FI', 'FR': 'FR',
@@ -17,6 +31,10 @@ class DataPreprocesser:
         }
 
         self.european_countries_iso2 = list(self.code_mapping.values())
+        self.eurostat_units = list(eurostat_units) if eurostat_units else ["MTOE", "TOE_HAB"]
+
+        # Name of the column holding the Kaggle temperature change values
+        self.kaggle_column = kaggle_column
     
 
     def convert_to_iso2(self, code: str) -> str:
@@ -25,79 +43,123 @@ class DataPreprocesser:
         else:
             raise Exception(f"Unknown code: {code}")
 
+
+    def convert_series_to_iso2(self, codes: pd.Series) -> pd.Series:
+        # Vectorized version of convert_to_iso2, raising for the first unknown code as well
+        if self.validated:
+            return codes.map(self.code_mapping)
+
+        unknown = codes[~codes.isin(self.code_mapping.keys())]
+        if len(unknown) > 0:
+            raise Exception(f"Unknown code: {unknown.iloc[0]}")
+
+        return codes.map(self.code_mapping)
+
     
     def _preprocess_eurostat(self) -> pd.DataFrame:
-        data = pd.read_csv(self.eurostat_fpath)
-        
+        # Eurostat is read first and defines the countries and years, only the units are selected here
+        data = pd.read_csv(self.eurostat_fpath, usecols=["unit", "geo", "TIME_PERIOD", "OBS_VALUE"])
+        data = data[data["unit"].isin(self.eurostat_units)]
+        data = data.assign(ISO2=self.convert_series_to_iso2(data["geo"]))
+
         '''
-        Creating for MTOE and TOE_HAB units two distinct dataframes. 
-        I found in the data exploration that some years are missing, therefore pivot_table is used.
-        This function creates a dataframe with the years as index and the countries as columns.
+        Creating one column per unit (by default MTOE and TOE_HAB).
+        I found in the data exploration that some years are missing, therefore pivot_table is used
+        and the result is reindexed to the full grid of countries and years reported for all units.
         Missing values are filled with NaN, which will be interpolated afterwards.
         '''
-        mtoe_df = data[data["unit"] == "MTOE"].pivot_table(index="TIME_PERIOD", columns="geo", values="OBS_VALUE")
-        mtoe_df.reset_index(inplace=True)
+        per_unit = data.groupby("unit")
+        grid_countries = reduce(np.intersect1d, [group["ISO2"].unique() for _, group in per_unit])
+        grid_years = reduce(np.intersect1d, [group["TIME_PERIOD"].unique() for _, group in per_unit])
 
-        # Transforming the columns to row for later concatenation.
-        mtoe_df = mtoe_df.melt(id_vars="TIME_PERIOD", var_name="geo", value_name="MTOE")
+        processed_df = data.pivot_table(index=["ISO2", "TIME_PERIOD"], columns="unit", values="OBS_VALUE")
+        processed_df = processed_df.reindex(
+            index=pd.MultiIndex.from_product([grid_countries, grid_years], names=["ISO2", "TIME_PERIOD"]),
+            columns=self.eurostat_units
+            )
+        processed_df.columns.name = None
 
-        # Doing the same for the TOE_HAB data
-        toe_hab_df = data[data["unit"] == "TOE_HAB"].pivot_table(index="TIME_PERIOD", columns="geo", values="OBS_VALUE")
-        toe_hab_df.reset_index(inplace=True)
-        toe_hab_df = toe_hab_df.melt(id_vars="TIME_PERIOD", var_name="geo", value_name="TOE_HAB")
-
-        # Merge both dataframes into one
-        processed_df = mtoe_df.merge(toe_hab_df, on=["TIME_PERIOD", "geo"])
-        
-        # Lastly, convert the country codes to ISO_2
-        processed_df["ISO2"] = processed_df["geo"].apply(lambda x: self.convert_to_iso2(x))    
+        return processed_df.reset_index()[["TIME_PERIOD", "ISO2"] + self.eurostat_units]
 
-        return processed_df.drop("geo", axis=1)
 
+    def _preprocess_kaggle(self, countries: List[str] = None, min_year: int = None) -> pd.DataFrame:
+        # Get the correct years by removing the F in the columns, only the header is read for that
+        header = pd.read_csv(self.kaggle_fpath, nrows=0).columns
+        year_columns = {col: int(col[1:]) for col in header if col.startswith("F") and col[1:].isdigit()}
+        if min_year is not None:
+            year_columns = {col: year for col, year in year_columns.items() if year >= min_year}
 
-    def _preprocess_kaggle(self) -> pd.DataFrame:
-        # Loading the complete data from the world
-        data = pd.read_csv(self.kaggle_fpath)
+        # Loading the data from the world, without the years before min_year and the unused columns
+        data = pd.read_csv(self.kaggle_fpath, usecols=["ISO2", "Country"] + list(year_columns))
 
         # Creating a dictionary that maps the ISO2 abbrevation to the country name. Will be used for later for enriching the data.
-        self.iso2_to_country = {
-            data["ISO2"].to_list()[idx]: data["Country"].to_list()[idx] for idx in range(len(data))
-            }
-
-        data = data.drop([
-            "ObjectId", 
-            "Country", 
-            "ISO3", 
-            "Indicator", 
-            "Unit", 
-            "Source", 
-            "CTS_Code", 
-            "CTS_Name",
-            "CTS_Full_Descriptor"], axis=1)
-
-        # Get the correct years by removing the F in the columns
-        data.columns = [el.replace("F", "") for el in data.columns]
+        self.iso2_to_country = dict(zip(data["ISO2"], data["Country"]))
 
-        '''
-        This preprocessing step should be done in a similar way as for the Eurostat data.
-        Therefore the data will get transposed, so that the ISO2 abbrevations are the column names
-        Afterwards, the data will get transformed similarly to the Eurostat data.
-        ISO2 gets renamed to TIME_PERIOD, since the years are saved there after the transpose.
-        '''
-        data.rename(columns={"ISO2": "TIME_PERIOD"}, inplace=True)
-        data.set_index("TIME_PERIOD", inplace=True)
-        transposed_data = data.T
-        transposed_data.reset_index(inplace=True)
+        # Selecting only the european countries before reshaping
+        data = data[data["ISO2"].isin(self.european_countries_iso2)]
+        self.kaggle_countries = data["ISO2"].unique().tolist()
+
+        if countries is not None:
+            data = data[data["ISO2"].isin(countries)]
 
-        # Renaming the index column as TIME_PERIOD, since the years are saved there
-        transposed_data.rename(columns={"index": "TIME_PERIOD"}, inplace=True)
+        data = data[["ISO2"] + list(year_columns)].rename(columns=year_columns)
 
         # Transforming columns to rows, similary as in _preprocess_eurostat()
-        processed_data = transposed_data.melt(id_vars="TIME_PERIOD", var_name="ISO2", value_name="CHANGE_INDICATOR")
+        processed_data = data.melt(id_vars="ISO2", var_name="TIME_PERIOD", value_name=self.kaggle_column)
         processed_data["TIME_PERIOD"] = processed_data["TIME_PERIOD"].astype(int)
 
-        # Selecting only the european countries
-        return processed_data[processed_data["ISO2"].isin(self.european_countries_iso2)]
+        return processed_data[["TIME_PERIOD", "ISO2", self.kaggle_column]].reset_index(drop=True)
+
+
+    @staticmethod
+    def join_on_country_year(frames: List[pd.DataFrame]) -> pd.DataFrame:
+        '''
+        Inner join of several (TIME_PERIOD, ISO2, indicator...) frames on the country-year key.
+        The key is integer coded as country_code * n_years + (year - first_year), with the country
+        codes taken from the sorted common countries. Every frame is aligned by one gather on that
+        integer key instead of merging on object-dtype string pairs, and the result comes out sorted
+        by country and year.
+        The country-year keys are expected to be unique within each frame.
+        '''
+        common_countries = pd.Index(reduce(np.intersect1d, [frame["ISO2"].unique() for frame in frames]))
+        first_year = min(frame["TIME_PERIOD"].min() for frame in frames)
+        years = np.arange(first_year, max(frame["TIME_PERIOD"].max() for frame in frames) + 1)
+        n_slots = len(common_countries) * len(years)
+
+        keys = []
+        in_all_frames = np.ones(n_slots, dtype=bool)
+        for frame in frames:
+            # Countries missing in any of the frames get the code -1 and are dropped
+            country_codes = common_countries.get_indexer(frame["ISO2"])
+            year_codes = frame["TIME_PERIOD"].to_numpy() - first_year
+
+            key = np.where(country_codes >= 0, country_codes * len(years) + year_codes, -1)
+            keys.append(key)
+
+            in_frame = np.zeros(n_slots, dtype=bool)
+            in_frame[key[key >= 0]] = True
+            in_all_frames &= in_frame
+
+        slots = np.flatnonzero(in_all_frames)
+
+        columns = {
+            "TIME_PERIOD": years[slots % len(years)],
+            "ISO2": np.asarray(common_countries, dtype=object)[slots // len(years)],
+        }
+
+        for frame, key in zip(frames, keys):
+            # Row position of every slot in this frame
+            position = np.full(n_slots, -1, dtype=np.intp)
+            position[key[key >= 0]] = np.flatnonzero(key >= 0)
+            rows = position[slots]
+
+            for col in frame.columns.drop(["TIME_PERIOD", "ISO2"]):
+                columns[col] = frame[col].to_numpy()[rows]
+
+        final_df = pd.DataFrame(columns)
+        final_df["ISO2"] = final_df["ISO2"].astype(str)
+
+        return final_df
 
 
     def clean_and_interpolate_data(self, df: pd.DataFrame, col: str, max_missing: int = 10) -> pd.DataFrame:
@@ -123,28 +185,19 @@ class DataPreprocesser:
 
 
     def get_final_data(self) -> pd.DataFrame:
-        # Ensure that both datasets uses the same countries
         eurostat_data = self._preprocess_eurostat()
-
-        # Eurostat only covers that starting from 2000
-        kaggle_data = self._preprocess_kaggle()
-
-        kaggle_data = kaggle_data[kaggle_data["TIME_PERIOD"] >= eurostat_data["TIME_PERIOD"].min()]
-
-        # Depending which dataset covers more countries, we will use the subset of the other dataset
-        kaggle_countries = kaggle_data["ISO2"].unique()
         eurostat_countries = eurostat_data["ISO2"].unique()
 
-        # Select the countries that are in both datasets
-        common_countries = list(set(kaggle_countries) & set(eurostat_countries)) 
-        print("Common countries: ", common_countries)
+        # Eurostat only covers that starting from 2000, only these years and countries are read from Kaggle
+        kaggle_data = self._preprocess_kaggle(
+            countries=eurostat_countries, min_year=eurostat_data["TIME_PERIOD"].min())
 
-        # Filter the dataframes to only include the common countries
-        kaggle_data = kaggle_data[kaggle_data["ISO2"].isin(common_countries)]
-        eurostat_data = eurostat_data[eurostat_data["ISO2"].isin(common_countries)]
-        print("Countries not included in the final dataset: ", set(kaggle_countries) ^ set(eurostat_countries))
+        # Select the countries that are in both datasets
+        common_countries = np.intersect1d(kaggle_data["ISO2"].unique(), eurostat_countries)
+        print("Common countries: ", common_countries.tolist())
+        print("Countries not included in the final dataset: ", set(self.kaggle_countries) ^ set(eurostat_countries))
 
-        final_df = pd.merge(kaggle_data, eurostat_data, on=["ISO2", "TIME_PERIOD"], how="inner")
+        final_df = self.join_on_country_year([kaggle_data, eurostat_data])
 
         print("Missing values in the final dataset before interpolation in percentage: ", final_df.isna().sum() / final_df.size)
         print("Final data description before interpolation: ", final_df.describe())
@@ -153,9 +206,9 @@ class DataPreprocesser:
         print("Performing interpolation for the final dataset.")
         print("-----------------------------------\n")
 
-        final_df = self.clean_and_interpolate_data(df=final_df, col="MTOE")
-        final_df = self.clean_and_interpolate_data(df=final_df, col="TOE_HAB")    
-        final_df = self.clean_and_interpolate_data(df=final_df, col="CHANGE_INDICATOR")
+        for unit in self.eurostat_units:
+            final_df = self.clean_and_interpolate_data(df=final_df, col=unit)
+        final_df = self.clean_and_interpolate_data(df=final_df, col=self.kaggle_column)
 
         print("Missing values in the final dataset after interpolation in percentage: ", final_df.isna().sum() / final_df.size)
         print("Final data description after interpolation: ", final_df.describe())
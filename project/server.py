@@ -0,0 +1,250 @@
+import os
+import io
+import json
+import asyncio
+import matplotlib
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from typing import Any, Dict, Hashable, Tuple
+
+from store import PanelStore
+
+# Figures are only rendered into memory, no GUI backend is needed
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+ROOT_DIR = os.path.join("..", "data")
+
+
+class LRUCache:
+    '''
+    Bounded least-recently-used cache for query results and rendered figures.
+    Only accessed from the event loop, therefore no locking is required.
+    '''
+    def __init__(self, maxsize: int = 128) -> None:
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items
+
+    def get(self, key: Hashable) -> Any:
+        if key not in self._items:
+            return None
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._items[key] = value
+        self._items.move_to_end(key)
+
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+
+class ResultServer:
+    '''
+    Local HTTP service for the pipeline results. The processed data (PanelStore) and the
+    Analysis object are loaded once, requests are then answered from this warm process.
+
+    GET /data?country=DE,FR&start=2000&end=2010&indicator=MTOE&format=json|arrow
+    GET /plot/<name>?column=MTOE&average=true  (name is one of PLOTS, returns a PNG)
+
+    Queries run in a thread pool, figures are rendered in a single dedicated thread
+    since pyplot is not thread-safe. Both kinds of results are kept in an LRU cache.
+    '''
+    PLOTS = {
+        "map": "create_map_plot",
+        "heatmap": "create_heatmap",
+        "lineplot": "create_lineplot",
+        "scatterplot": "create_scatterplot",
+        "correlation": "create_correlation_plot",
+        "twinx_scatterplot": "twinx_scatterplot",
+        "twinx_lineplot": "twinx_lineplot",
+    }
+
+    def __init__(
+            self,
+            store_path: str,
+            host: str = "127.0.0.1",
+            port: int = 8000,
+            cache_size: int = 128
+            ) -> None:
+
+        self.store = PanelStore(store_path)
+        self.host = host
+        self.port = port
+
+        self.query_cache = LRUCache(cache_size)
+        self.plot_cache = LRUCache(cache_size)
+        self._pending = {}
+
+        self.query_executor = ThreadPoolExecutor()
+        self.render_executor = ThreadPoolExecutor(max_workers=1)
+        self.analysis = None
+
+
+    def _load_analysis(self) -> None:
+        if self.analysis is not None:
+            return
+
+        # Imported here, so that serving data does not require the geo dependencies
+        from analysis import Analysis
+
+        # Built from the already opened store, so that /data and /plot serve the same version
+        self.analysis = Analysis(self.store.to_frame())
+
+
+    def _query(self, params: Dict[str, str]) -> Tuple[str, bytes]:
+        countries = params["country"].split(",") if "country" in params else None
+        indicators = params["indicator"].split(",") if "indicator" in params else None
+        start = int(params["start"]) if "start" in params else None
+        end = int(params["end"]) if "end" in params else None
+
+        frame = self.store.select(countries=countries, start_year=start, end_year=end, indicators=indicators)
+
+        output_format = params.get("format", "json")
+        if output_format == "json":
+            return "application/json", frame.to_json(orient="records").encode("utf-8")
+
+        if output_format == "arrow":
+            try:
+                import pyarrow as pa
+            except ImportError:
+                raise ValueError("Arrow output requires pyarrow to be installed")
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return "application/vnd.apache.arrow.stream", sink.getvalue().to_pybytes()
+
+        raise ValueError(f"Unknown format {output_format}")
+
+
+    @staticmethod
+    def _parse_value(value: str) -> Any:
+        if value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        try:
+            return int(value)
+        except ValueError:
+            pass
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+    def _render(self, name: str, params: Dict[str, str]) -> Tuple[str, bytes]:
+        self._load_analysis()
+        kwargs = {key: self._parse_value(value) for key, value in params.items()}
+
+        if "save" in kwargs:
+            raise ValueError("Plots are only rendered into the response, save is not allowed")
+
+        try:
+            # Nothing is written to the plot folder, the figure is only saved into the buffer
+            getattr(self.analysis, self.PLOTS[name])(**kwargs, save=False)
+
+            buffer = io.BytesIO()
+            plt.gcf().savefig(buffer, format="png")
+        finally:
+            plt.close("all")
+
+        return "image/png", buffer.getvalue()
+
+
+    async def _cached(self, cache: LRUCache, executor: ThreadPoolExecutor, key: Hashable, func, *args) -> Tuple[str, bytes]:
+        result = cache.get(key)
+        if result is not None:
+            return result
+
+        # Concurrent requests for the same key wait for the same computation
+        if key not in self._pending:
+            loop = asyncio.get_running_loop()
+            self._pending[key] = loop.run_in_executor(executor, func, *args)
+
+        try:
+            result = await self._pending[key]
+        finally:
+            self._pending.pop(key, None)
+
+        cache.put(key, result)
+        return result
+
+
+    async def handle_request(self, target: str) -> Tuple[int, str, bytes]:
+        url = urlsplit(target)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        key = (url.path, tuple(sorted(params.items())))
+        name = url.path[len("/plot/"):] if url.path.startswith("/plot/") else None
+
+        if url.path != "/data" and name not in self.PLOTS:
+            return 404, "application/json", json.dumps({"error": f"Not found: {url.path}"}).encode("utf-8")
+
+        try:
+            if name is None:
+                content_type, body = await self._cached(
+                    self.query_cache, self.query_executor, key, self._query, params)
+            else:
+                content_type, body = await self._cached(
+                    self.plot_cache, self.render_executor, key, self._render, name, params)
+
+        except (ValueError, TypeError) as e:
+            return 400, "application/json", json.dumps({"error": str(e)}).encode("utf-8")
+        except Exception as e:
+            return 500, "application/json", json.dumps({"error": str(e)}).encode("utf-8")
+
+        return 200, content_type, body
+
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+
+            # Headers are not used, but have to be consumed
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+
+            if len(request_line) < 2 or request_line[0] != "GET":
+                status, content_type, body = 405, "application/json", b'{"error": "Only GET is supported"}'
+            else:
+                status, content_type, body = await self.handle_request(request_line[1])
+
+            header = (
+                f"HTTP/1.1 {status} {reasons[status]}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n"
+            )
+            writer.write(header.encode("latin-1") + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+    async def serve(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        # Loading the data and the geodata once before accepting requests
+        await loop.run_in_executor(self.query_executor, lambda: self.store.cube)
+        await loop.run_in_executor(self.render_executor, self._load_analysis)
+
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        print(f"Serving results on http://{self.host}:{self.port}")
+
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    server = ResultServer(os.path.join(ROOT_DIR, "final_data_store"))
+    asyncio.run(server.serve())
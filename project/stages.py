@@ -0,0 +1,175 @@
+import os
+import json
+import hashlib
+import threading
+
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List
+
+
+def file_hash(path: str) -> str:
+    # Streamed, so that large inputs are not loaded at once
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class Stage:
+    '''
+    A single step of a pipeline. The dependencies between stages are not declared explicitly,
+    a stage depends on every stage producing one of its input files.
+    params are part of the fingerprint, e.g. an URL that changes what a download returns.
+    always_run: The stage is never skipped, e.g. a download whose remote data can change without
+    any change of its inputs.
+    '''
+    name: str
+    func: Callable[[], Any]
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    params: Dict[str, Any] = field(default_factory=dict)
+    always_run: bool = False
+
+
+class StageRunner:
+    '''
+    Runs stages in dependency order. Stages whose dependencies are done are executed
+    concurrently in a thread pool. A stage is skipped when all of its outputs exist and
+    the fingerprint of the content of its inputs and its params equals the one recorded at its last run,
+    stages marked with always_run are never skipped.
+    '''
+    def __init__(self, stages: List[Stage], state_path: str, max_workers: int = None) -> None:
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path
+        self.max_workers = max_workers
+
+        if len(self.stages) != len(stages):
+            raise ValueError("Stage names must be unique")
+
+        self.dependencies = self._build_dependencies()
+        self._lock = threading.Lock()
+        self._hashes = {}
+
+
+    def _build_dependencies(self) -> Dict[str, List[str]]:
+        producers = {}
+        for stage in self.stages.values():
+            for output in stage.outputs:
+                if output in producers:
+                    raise ValueError(f"Output {output} is produced by {producers[output]} and {stage.name}")
+                producers[output] = stage.name
+
+        dependencies = {
+            stage.name: sorted({producers[path] for path in stage.inputs if path in producers})
+            for stage in self.stages.values()
+        }
+
+        # Topological sort, only used to detect cycles before anything is executed
+        visited = set()
+        remaining = dict(dependencies)
+        while remaining:
+            ready = [name for name, deps in remaining.items() if all(dep in visited for dep in deps)]
+            if not ready:
+                raise ValueError(f"Cyclic dependencies between stages: {sorted(remaining)}")
+            for name in ready:
+                visited.add(name)
+                del remaining[name]
+
+        return dependencies
+
+
+    def content_hash(self, path: str) -> str:
+        '''
+        Streamed sha256 of a file. A download rewriting a file with the same bytes does not change
+        the hash, so the stages reading it are still skipped. The hash is cached by size and
+        modification time, so that every input is read at most once per run.
+        '''
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+
+        if key not in self._hashes:
+            self._hashes[key] = file_hash(path)
+
+        return self._hashes[key]
+
+
+    def fingerprint(self, stage: Stage) -> str:
+        digest = hashlib.sha256()
+        digest.update(json.dumps(stage.params, sort_keys=True, default=str).encode("utf-8"))
+
+        for path in sorted(stage.inputs):
+            if os.path.exists(path):
+                digest.update(f"{path}:{self.content_hash(path)}".encode("utf-8"))
+            else:
+                digest.update(f"{path}:missing".encode("utf-8"))
+
+        return digest.hexdigest()
+
+
+    def _load_state(self) -> Dict[str, str]:
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path) as file:
+            return json.load(file)
+
+
+    def _save_state(self, state: Dict[str, str]) -> None:
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(state, file, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+
+    def is_up_to_date(self, stage: Stage, state: Dict[str, str]) -> bool:
+        if stage.always_run:
+            return False
+        if not stage.outputs or not all(os.path.exists(path) for path in stage.outputs):
+            return False
+        return state.get(stage.name) == self.fingerprint(stage)
+
+
+    def _execute(self, stage: Stage, state: Dict[str, str], force: bool) -> Any:
+        if not force and self.is_up_to_date(stage, state):
+            print(f"Stage {stage.name} is up to date, skipping.")
+            return None
+
+        print(f"Running stage {stage.name}.")
+        fingerprint = self.fingerprint(stage)
+        result = stage.func()
+
+        missing = [path for path in stage.outputs if not os.path.exists(path)]
+        if missing:
+            raise RuntimeError(f"Stage {stage.name} did not create {missing}")
+
+        with self._lock:
+            state[stage.name] = fingerprint
+            self._save_state(state)
+
+        return result
+
+
+    def run(self, force: bool = False) -> Dict[str, Any]:
+        state = self._load_state()
+        results = {}
+        done = set()
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while len(done) < len(self.stages):
+                for name, deps in self.dependencies.items():
+                    if name not in done and name not in running.values() and all(dep in done for dep in deps):
+                        future = executor.submit(self._execute, self.stages[name], state, force)
+                        running[future] = name
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+
+                    # Failing fast, stages that are already running are finished by the executor
+                    results[name] = future.result()
+                    done.add(name)
+
+        return results
@@ -0,0 +1,204 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+from typing import List, Sequence
+
+
+class PanelStore:
+    '''
+    On-disk store for the processed panel (country x year x indicator).
+
+    The values are kept in a raw float64 NumPy cube (cube.npy) next to a small index file
+    (index.json) holding the labels of every axis. Every write creates a new version directory
+    with both files, the file CURRENT names the version that is read. Readers open the cube with
+    mmap_mode="r", so opening is independent of the dataset size and all processes reading the
+    same store share the same pages of the OS page cache. Only slicing the map reads from these
+    shared pages, the frames returned by select and to_frame are private copies.
+    '''
+    ID_COLUMNS = ["TIME_PERIOD", "ISO2"]
+    NAME_COLUMN = "COUNTRY"
+
+    # Older versions are kept, so that readers that opened them before a write can still finish
+    KEEP_VERSIONS = 2
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.current_path = os.path.join(path, "CURRENT")
+
+        self._version = None
+        self._cube = None
+        self._index = None
+
+
+    @property
+    def version(self) -> str:
+        # Read once, so that the cube and the index of a reader always belong to the same write
+        if self._version is None:
+            with open(self.current_path) as file:
+                self._version = file.read().strip()
+        return self._version
+
+
+    @property
+    def cube_path(self) -> str:
+        return os.path.join(self.path, self.version, "cube.npy")
+
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.path, self.version, "index.json")
+
+
+    def exists(self) -> bool:
+        return os.path.exists(self.current_path) and os.path.exists(self.cube_path) and os.path.exists(self.index_path)
+
+
+    def _versions(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.path) if name.startswith("v") and name[1:].isdigit())
+
+
+    def write(self, data: pd.DataFrame) -> None:
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+        indicators = [col for col in data.columns if col not in self.ID_COLUMNS + [self.NAME_COLUMN]]
+
+        countries = np.sort(data["ISO2"].unique())
+        years = np.sort(data["TIME_PERIOD"].unique())
+
+        # Scatter the long frame into the dense cube, missing (country, year) pairs stay NaN
+        country_idx = np.searchsorted(countries, data["ISO2"].to_numpy())
+        year_idx = np.searchsorted(years, data["TIME_PERIOD"].to_numpy())
+
+        cube = np.full((len(countries), len(years), len(indicators)), np.nan, dtype=np.float64)
+        cube[country_idx, year_idx, :] = data[indicators].to_numpy(dtype=np.float64)
+
+        if self.NAME_COLUMN in data.columns:
+            names = data.drop_duplicates("ISO2").set_index("ISO2")[self.NAME_COLUMN].reindex(countries).tolist()
+        else:
+            names = None
+
+        index = {
+            "countries": countries.tolist(),
+            "years": [int(year) for year in years],
+            "indicators": indicators,
+            "names": names,
+            "columns": data.columns.tolist(),
+        }
+
+        '''
+        Both files are written into a new version directory, which is then published by atomically
+        replacing CURRENT. A reader therefore sees either the old or the new pair of files, never a
+        new cube with an old index. Processes that still have an old cube mapped keep reading it.
+        '''
+        versions = self._versions()
+        version = f"v{int(versions[-1][1:]) + 1 if versions else 1:06d}"
+        version_path = os.path.join(self.path, version)
+        os.makedirs(version_path)
+
+        np.save(os.path.join(version_path, "cube.npy"), cube)
+        with open(os.path.join(version_path, "index.json"), "w") as file:
+            json.dump(index, file)
+
+        tmp_current_path = self.current_path + ".tmp"
+        with open(tmp_current_path, "w") as file:
+            file.write(version)
+        os.replace(tmp_current_path, self.current_path)
+
+        for old_version in self._versions()[:-self.KEEP_VERSIONS]:
+            shutil.rmtree(os.path.join(self.path, old_version), ignore_errors=True)
+
+        self._version = None
+        self._cube = None
+        self._index = None
+
+
+    @property
+    def index(self) -> dict:
+        if self._index is None:
+            with open(self.index_path) as file:
+                self._index = json.load(file)
+        return self._index
+
+
+    @property
+    def cube(self) -> np.ndarray:
+        # Read-only memory map, nothing is loaded until the pages are touched
+        if self._cube is None:
+            # The index is opened together with the cube, in case this version is removed by later writes
+            self.index
+            self._cube = np.load(self.cube_path, mmap_mode="r")
+        return self._cube
+
+
+    @property
+    def countries(self) -> List[str]:
+        return self.index["countries"]
+
+
+    @property
+    def years(self) -> List[int]:
+        return self.index["years"]
+
+
+    @property
+    def indicators(self) -> List[str]:
+        return self.index["indicators"]
+
+
+    def select(
+            self,
+            countries: Sequence[str] = None,
+            start_year: int = None,
+            end_year: int = None,
+            indicators: Sequence[str] = None
+            ) -> pd.DataFrame:
+
+        index = self.index
+        cube = self.cube
+
+        # Years are sorted, so a year range is a contiguous slice of the memory map
+        years = np.asarray(index["years"])
+        year_start = 0 if start_year is None else int(np.searchsorted(years, start_year, side="left"))
+        year_stop = len(years) if end_year is None else int(np.searchsorted(years, end_year, side="right"))
+
+        if countries is None:
+            country_idx = np.arange(len(index["countries"]))
+        else:
+            lookup = {code: idx for idx, code in enumerate(index["countries"])}
+            unknown = [code for code in countries if code not in lookup]
+            if unknown:
+                raise ValueError(f"Countries {unknown} not in the store")
+            country_idx = np.array([lookup[code] for code in countries], dtype=np.intp)
+
+        if indicators is None:
+            indicators = index["indicators"]
+        unknown = [col for col in indicators if col not in index["indicators"]]
+        if unknown:
+            raise ValueError(f"Columns {unknown} not in the store")
+        indicator_idx = [index["indicators"].index(col) for col in indicators]
+
+        values = cube[country_idx, year_start:year_stop][:, :, indicator_idx]
+        n_countries, n_years, _ = values.shape
+
+        frame = pd.DataFrame(values.reshape(n_countries * n_years, len(indicators)), columns=list(indicators))
+        frame.insert(0, "ISO2", np.repeat(np.asarray(index["countries"], dtype=object)[country_idx], n_years))
+        frame.insert(0, "TIME_PERIOD", np.tile(years[year_start:year_stop], n_countries))
+
+        if index["names"] is not None:
+            names = np.asarray(index["names"], dtype=object)[country_idx]
+            frame[self.NAME_COLUMN] = np.repeat(names, n_years)
+
+        # Pairs that were never written are all-NaN in the cube and are not part of the panel
+        frame = frame[frame[list(indicators)].notna().any(axis=1)]
+
+        return frame.reset_index(drop=True)
+
+
+    def to_frame(self) -> pd.DataFrame:
+        # Restoring the layout of final_data.csv
+        frame = self.select()
+        return frame[[col for col in self.index["columns"] if col in frame.columns]]
@@ -1,9 +1,33 @@
 import os
+import io
+import json
+import asyncio
+import shutil
+import tempfile
+import dataclasses
+import importlib.util
+import geopandas as gpd
+import numpy as np
 import pandas as pd
 import unittest
+import matplotlib
 
+# Plots are rendered without a display
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from unittest import mock
+from matplotlib.collections import PathCollection
+from shapely.geometry import MultiPolygon, Polygon, box
+
+from analysis import Analysis
 from preprocessing import DataPreprocesser
 from pipeline import DataPipeline
+from pipeline_config import DEFAULT_CONFIG
+from store import PanelStore
+from stages import Stage, StageRunner
+from validation import DataValidator, ValidationReport
+from server import LRUCache, ResultServer
 
 
 class TestDataPreprocessor(unittest.TestCase):
@@ -66,6 +90,10 @@ class TestDataPipeline(unittest.TestCase):
     '''
     setUpClass: Initializes the class variables before the tests are run.
     test_data_pipeline_run: Tests that the run method returns a DataFrame and that the final_data.csv file is created.
+    test_data_pipeline_skips_up_to_date_stages: Tests that a second run does not preprocess the data again.
+    test_downloads_run_on_every_run: Tests that the download stages are never skipped, but unchanged downloads do not rerun preprocessing.
+    test_invalid_readers: Tests that configs with duplicate or unknown readers are rejected.
+    test_kaggle_target_column: Tests that the target column of the kaggle source is used in the final data.
     '''
     @classmethod
     def setUpClass(cls):
@@ -77,11 +105,14 @@ class TestDataPipeline(unittest.TestCase):
         if os.path.exists(save_path):
             os.remove(save_path)
 
-        cls.pipeline = DataPipeline(save_path=save_path)
+        cls.sample_dir = SAMPLE_DIR
+        cls.pipeline = DataPipeline(save_path=save_path, fixture_dir=SAMPLE_DIR)
 
-        cls.pipeline.ROOT_DIR = SAMPLE_DIR
-        cls.pipeline.kaggle = os.path.join(SAMPLE_DIR, "kaggle_sample.csv")
-        cls.pipeline.eurostat = os.path.join(SAMPLE_DIR, "eurostat_sample.csv")
+
+    def _tmp_dir(self) -> str:
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        return tmp_dir
 
 
     def test_data_pipeline_run(self):
@@ -92,7 +123,654 @@ class TestDataPipeline(unittest.TestCase):
         self.assertTrue(os.path.exists(self.pipeline.eurostat))
 
         self.assertTrue(os.path.exists(self.pipeline.save_path))
+        self.assertTrue(PanelStore(self.pipeline.sink_paths["store"]).exists())
+
+
+    def test_data_pipeline_skips_up_to_date_stages(self):
+        self.pipeline.run()
+        modified = os.path.getmtime(self.pipeline.save_path)
+
+        result = self.pipeline.run()
+        self.assertIsInstance(result, pd.DataFrame)
+        self.assertEqual(os.path.getmtime(self.pipeline.save_path), modified)
+
+
+    def test_downloads_run_on_every_run(self):
+        pipeline = DataPipeline(config=dataclasses.replace(DEFAULT_CONFIG, data_dir=self._tmp_dir()))
+        downloaded = []
+
+        # Downloading is replaced by copying the sample data
+        def download_source(source):
+            downloaded.append(source.name)
+            shutil.copy(os.path.join(self.sample_dir, source.fixture), pipeline.source_paths[source.name])
+
+        pipeline.download_source = download_source
+
+        preprocessed = []
+        preprocess_stage = pipeline._preprocess_stage
+
+        def counting_preprocess_stage():
+            preprocessed.append(True)
+            return preprocess_stage()
+
+        pipeline._preprocess_stage = counting_preprocess_stage
+
+        pipeline.run()
+        pipeline.run()
+        self.assertEqual(sorted(downloaded), ["eurostat", "eurostat", "kaggle", "kaggle"])
+
+        # The downloaded files were rewritten with the same content, preprocessing is skipped
+        self.assertEqual(len(preprocessed), 1)
+
+
+    def test_invalid_readers(self):
+        kaggle, eurostat = DEFAULT_CONFIG.sources
+        configs = [
+            [kaggle, eurostat, dataclasses.replace(kaggle, name="kaggle2")],
+            [kaggle, dataclasses.replace(eurostat, reader="unknown")],
+            [dataclasses.replace(kaggle, columns=["A", "B"]), eurostat],
+        ]
+
+        for sources in configs:
+            with self.assertRaises(ValueError):
+                DataPipeline(config=dataclasses.replace(DEFAULT_CONFIG, sources=sources), fixture_dir=self.sample_dir)
+
+
+    def test_kaggle_target_column(self):
+        kaggle, eurostat = DEFAULT_CONFIG.sources
+        config = dataclasses.replace(DEFAULT_CONFIG, sources=[dataclasses.replace(kaggle, columns=["TEMPERATURE_CHANGE"]), eurostat])
+
+        pipeline = DataPipeline(
+            save_path=os.path.join(self._tmp_dir(), "final_data.csv"), config=config, fixture_dir=self.sample_dir)
+        result = pipeline.run()
+
+        self.assertTrue("TEMPERATURE_CHANGE" in result.columns)
+        self.assertFalse("CHANGE_INDICATOR" in result.columns)
+
+
+class TestDataValidator(unittest.TestCase):
+    '''
+    test_sample_data_valid: Tests that the sample data passes the validation and that stats are recorded.
+    test_invalid_eurostat_data: Tests that unknown codes, duplicate keys and unknown flags are reported.
+    test_missing_columns: Tests that a file without the expected columns is rejected.
+    test_non_numeric_years: Tests that a file without any numeric TIME_PERIOD is reported instead of failing.
+    test_pipeline_fails_before_preprocessing: Tests that the pipeline stops after a failed validation.
+    test_report_tied_to_inputs: Tests that a saved report is not trusted for inputs that changed after the validation.
+    '''
+    @classmethod
+    def setUpClass(cls):
+        SAMPLE_DIR = os.path.join("..", "sample_data")
+        cls.kaggle_fpath = os.path.join(SAMPLE_DIR, "kaggle_sample.csv")
+        cls.eurostat_fpath = os.path.join(SAMPLE_DIR, "eurostat_sample.csv")
+
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+
+    def _write_invalid_eurostat(self) -> str:
+        data = pd.read_csv(self.eurostat_fpath)
+        mtoe = data[data["unit"] == "MTOE"]
+
+        unknown_code = mtoe.iloc[[0]].assign(geo="ZZ")
+        duplicate = mtoe.iloc[[1]]
+        unknown_flag = mtoe.iloc[[2]].assign(TIME_PERIOD=1990, OBS_FLAG="q")
+
+        fpath = os.path.join(self.tmp_dir, "eurostat_sample.csv")
+        pd.concat([data, unknown_code, duplicate, unknown_flag]).to_csv(fpath, index=False)
+        return fpath
+
+
+    def test_sample_data_valid(self):
+        report = DataValidator(self.kaggle_fpath, self.eurostat_fpath, chunksize=500).validate()
+
+        self.assertTrue(report.valid)
+        self.assertEqual(report.stats["eurostat_sample.csv"]["rows"], 2514)
+        self.assertTrue("ME" in report.stats["kaggle_sample.csv"]["missing_runs"])
+
+
+    def test_invalid_eurostat_data(self):
+        report = DataValidator(self.kaggle_fpath, self._write_invalid_eurostat(), chunksize=500).validate()
+        errors = "\n".join(report.errors)
+
+        self.assertFalse(report.valid)
+        self.assertTrue("ZZ" in errors)
+        self.assertTrue("Duplicate" in errors)
+        self.assertTrue("'q'" in errors)
+
+        with self.assertRaises(ValueError):
+            report.raise_for_errors()
+
+
+    def test_missing_columns(self):
+        fpath = os.path.join(self.tmp_dir, "eurostat_sample.csv")
+        pd.read_csv(self.eurostat_fpath).drop("OBS_FLAG", axis=1).to_csv(fpath, index=False)
+
+        report = DataValidator(self.kaggle_fpath, fpath).validate()
+        self.assertFalse(report.valid)
+
+
+    def test_non_numeric_years(self):
+        fpath = os.path.join(self.tmp_dir, "eurostat_sample.csv")
+        pd.read_csv(self.eurostat_fpath).assign(TIME_PERIOD="x").to_csv(fpath, index=False)
+
+        report = DataValidator(self.kaggle_fpath, fpath).validate()
+        self.assertFalse(report.valid)
+        self.assertTrue(any("TIME_PERIOD" in error for error in report.errors))
+        self.assertEqual(report.stats["eurostat_sample.csv"]["years"], [])
+
+
+    def test_pipeline_fails_before_preprocessing(self):
+        shutil.copy(self.kaggle_fpath, self.tmp_dir)
+        self._write_invalid_eurostat()
+
+        pipeline = DataPipeline(save_path=os.path.join(self.tmp_dir, "final_data.csv"), fixture_dir=self.tmp_dir)
+
+        with self.assertRaises(ValueError):
+            pipeline.run()
+
+        self.assertTrue(os.path.exists(pipeline.validation_path))
+        self.assertFalse(os.path.exists(pipeline.save_path))
+
+
+    def test_report_tied_to_inputs(self):
+        shutil.copy(self.kaggle_fpath, self.tmp_dir)
+        shutil.copy(self.eurostat_fpath, self.tmp_dir)
+
+        pipeline = DataPipeline(save_path=os.path.join(self.tmp_dir, "final_data.csv"), fixture_dir=self.tmp_dir)
+        pipeline.validate_data()
+        self.assertTrue(ValidationReport.valid_for(pipeline.validation_path, [pipeline.kaggle, pipeline.eurostat]))
+
+        # The unknown code of the changed file is caught by preprocessing instead
+        data = pd.read_csv(self.eurostat_fpath)
+        unknown_code = data[data["unit"] == "MTOE"].iloc[[0]].assign(geo="ZZ")
+        pd.concat([data, unknown_code]).to_csv(pipeline.eurostat, index=False)
+        self.assertFalse(ValidationReport.valid_for(pipeline.validation_path, [pipeline.kaggle, pipeline.eurostat]))
+
+        with self.assertRaisesRegex(Exception, "Unknown code: ZZ"):
+            pipeline.preprocess_data()
+
+
+class TestStageRunner(unittest.TestCase):
+    '''
+    test_dependency_order: Tests that stages run after the stages producing their inputs.
+    test_skip_and_rerun: Tests that a stage is skipped until one of its inputs changes.
+    test_cycle: Tests that cyclic dependencies are rejected.
+    '''
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.state_path = os.path.join(self.tmp_dir, "state.json")
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.tmp_dir, name)
+
+
+    def _write(self, name: str, content: str, calls: list) -> None:
+        calls.append(name)
+        with open(self._path(name), "w") as file:
+            file.write(content)
+
+
+    def _stages(self, calls: list) -> list:
+        return [
+            Stage("c", lambda: self._write("c", "c", calls), inputs=[self._path("a"), self._path("b")], outputs=[self._path("c")]),
+            Stage("a", lambda: self._write("a", "a", calls), outputs=[self._path("a")]),
+            Stage("b", lambda: self._write("b", "b", calls), outputs=[self._path("b")]),
+        ]
+
+
+    def test_dependency_order(self):
+        calls = []
+        StageRunner(self._stages(calls), self.state_path).run()
+
+        self.assertEqual(sorted(calls[:2]), ["a", "b"])
+        self.assertEqual(calls[2], "c")
+
+
+    def test_skip_and_rerun(self):
+        calls = []
+        StageRunner(self._stages(calls), self.state_path).run()
+
+        calls.clear()
+        StageRunner(self._stages(calls), self.state_path).run()
+        self.assertEqual(calls, [])
+
+        # Changing an input by hand invalidates only the stages depending on it
+        with open(self._path("a"), "w") as file:
+            file.write("changed input")
+
+        StageRunner(self._stages(calls), self.state_path).run()
+        self.assertEqual(calls, ["c"])
+
+
+    def test_cycle(self):
+        stages = [
+            Stage("a", lambda: None, inputs=[self._path("b")], outputs=[self._path("a")]),
+            Stage("b", lambda: None, inputs=[self._path("a")], outputs=[self._path("b")]),
+        ]
+
+        with self.assertRaises(ValueError):
+            StageRunner(stages, self.state_path)
+
+
+class TestPanelStore(unittest.TestCase):
+    '''
+    test_roundtrip: Tests that the final data read back from the store equals the written data.
+    test_memory_mapped: Tests that the cube is opened read-only as a memory map.
+    test_select: Tests that country, year and indicator filters are applied on the store.
+    test_versioned_write: Tests that every write is published as a new version and old versions are cleaned up.
+    '''
+    @classmethod
+    def setUpClass(cls):
+        SAMPLE_DIR = os.path.join("..", "sample_data")
+        preprocessor = DataPreprocesser(
+            kaggle_fpath=os.path.join(SAMPLE_DIR, "kaggle_sample.csv"),
+            eurostat_fpath=os.path.join(SAMPLE_DIR, "eurostat_sample.csv")
+            )
+
+        cls.final_data = preprocessor.get_final_data()
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.store = PanelStore(os.path.join(cls.tmp_dir, "final_data_store"))
+        cls.store.write(cls.final_data)
+
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+
+    def test_roundtrip(self):
+        result = PanelStore(self.store.path).to_frame()
+        expected = self.final_data.sort_values(["ISO2", "TIME_PERIOD"]).reset_index(drop=True)
+
+        self.assertEqual(result.columns.tolist(), self.final_data.columns.tolist())
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+    def test_memory_mapped(self):
+        cube = PanelStore(self.store.path).cube
+        self.assertIsInstance(cube, np.memmap)
+        self.assertFalse(cube.flags.writeable)
+
+
+    def test_select(self):
+        countries = self.store.countries[:2]
+        result = self.store.select(countries=countries, start_year=2005, end_year=2010, indicators=["MTOE"])
+
+        self.assertTrue(set(result["ISO2"]) <= set(countries))
+        self.assertTrue(result["TIME_PERIOD"].between(2005, 2010).all())
+        self.assertTrue("MTOE" in result.columns)
+        self.assertFalse("TOE_HAB" in result.columns)
+
+        with self.assertRaises(ValueError):
+            self.store.select(indicators=["UNKNOWN"])
+
+
+    def test_versioned_write(self):
+        store = PanelStore(os.path.join(self.tmp_dir, "versioned_store"))
+        store.write(self.final_data)
+
+        # A reader opened before the next write keeps a consistent cube and index
+        reader = PanelStore(store.path)
+        reader.cube
+        smaller = self.final_data[self.final_data["ISO2"] != self.final_data["ISO2"].iloc[0]]
+
+        for _ in range(3):
+            store.write(smaller)
+
+        self.assertEqual(reader.cube.shape[0], len(reader.countries))
+        self.assertEqual(len(PanelStore(store.path).countries), len(reader.countries) - 1)
+        self.assertEqual(len(store._versions()), PanelStore.KEEP_VERSIONS)
+
+class StubAnalysis:
+    # Stands in for Analysis in the server tests, which would need the Natural Earth geodata
+    def __init__(self) -> None:
+        self.calls = []
+
+    def create_lineplot(self, column: str, average: bool = True, save: bool = True) -> None:
+        self.calls.append((column, average, save))
+        plt.plot([2000, 2001, 2002], [0, 1, 0])
+
+
+class TestResultServer(unittest.TestCase):
+    '''
+    test_lru_cache: Tests that the least recently used entry is evicted first.
+    test_data_query: Tests that filtered slices are served as JSON and cached.
+    test_arrow_query: Tests that slices are served as an Arrow IPC stream (requires pyarrow).
+    test_arrow_without_pyarrow: Tests that format=arrow is rejected when pyarrow is not installed.
+    test_plot: Tests that plots are rendered into the response as PNG without being saved.
+    test_errors: Tests that unknown routes and invalid parameters are rejected.
+    test_http_roundtrip: Tests a GET request over a socket.
+    '''
+    @classmethod
+    def setUpClass(cls):
+        SAMPLE_DIR = os.path.join("..", "sample_data")
+        preprocessor = DataPreprocesser(
+            kaggle_fpath=os.path.join(SAMPLE_DIR, "kaggle_sample.csv"),
+            eurostat_fpath=os.path.join(SAMPLE_DIR, "eurostat_sample.csv")
+            )
+
+        cls.tmp_dir = tempfile.mkdtemp()
+        store_path = os.path.join(cls.tmp_dir, "final_data_store")
+        PanelStore(store_path).write(preprocessor.get_final_data())
+
+        cls.server = ResultServer(store_path, port=0, cache_size=2)
+
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+
+    def test_lru_cache(self):
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        self.assertTrue("a" in cache)
+        self.assertFalse("b" in cache)
+        self.assertEqual(len(cache), 2)
+
+
+    def test_data_query(self):
+        country = self.server.store.countries[0]
+        status, content_type, body = asyncio.run(
+            self.server.handle_request(f"/data?country={country}&start=2010&end=2012&indicator=MTOE"))
+
+        self.assertEqual(status, 200)
+        self.assertEqual(content_type, "application/json")
+
+        records = json.loads(body)
+        self.assertEqual(len(records), 3)
+        self.assertTrue(all(record["ISO2"] == country for record in records))
+        self.assertTrue(all("MTOE" in record and "TOE_HAB" not in record for record in records))
+        self.assertTrue(len(self.server.query_cache) >= 1)
+
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_arrow_query(self):
+        import pyarrow as pa
+
+        status, content_type, body = asyncio.run(
+            self.server.handle_request("/data?start=2010&end=2012&indicator=MTOE&format=arrow"))
+
+        self.assertEqual(status, 200)
+        self.assertEqual(content_type, "application/vnd.apache.arrow.stream")
+
+        result = pa.ipc.open_stream(body).read_all().to_pandas()
+        expected = self.server.store.select(start_year=2010, end_year=2012, indicators=["MTOE"])
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+    @unittest.skipIf(importlib.util.find_spec("pyarrow"), "pyarrow is installed")
+    def test_arrow_without_pyarrow(self):
+        status, _, body = asyncio.run(self.server.handle_request("/data?format=arrow"))
+
+        self.assertEqual(status, 400)
+        self.assertTrue("pyarrow" in json.loads(body)["error"])
+
+
+    def test_plot(self):
+        server = ResultServer(self.server.store.path, port=0)
+        server.analysis = StubAnalysis()
+
+        for _ in range(2):
+            status, content_type, body = asyncio.run(
+                server.handle_request("/plot/lineplot?column=MTOE&average=false"))
+
+            self.assertEqual(status, 200)
+            self.assertEqual(content_type, "image/png")
+            self.assertEqual(plt.imread(io.BytesIO(body)).ndim, 3)
+
+        # Rendered once without saving into the plot folder, the second response comes from the cache
+        self.assertEqual(server.analysis.calls, [("MTOE", False, False)])
+        self.assertEqual(plt.get_fignums(), [])
+
+        status, _, _ = asyncio.run(server.handle_request("/plot/lineplot?column=MTOE&save=true"))
+        self.assertEqual(status, 400)
+
+
+    def test_errors(self):
+        status, _, _ = asyncio.run(self.server.handle_request("/unknown"))
+        self.assertEqual(status, 404)
+
+        status, _, _ = asyncio.run(self.server.handle_request("/plot/unknown"))
+        self.assertEqual(status, 404)
+
+        status, _, _ = asyncio.run(self.server.handle_request("/data?indicator=UNKNOWN"))
+        self.assertEqual(status, 400)
+
+
+    def test_http_roundtrip(self):
+        async def roundtrip():
+            server = await asyncio.start_server(self.server._handle_connection, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+
+            async with server:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(b"GET /data?start=2020 HTTP/1.1\r\nHost: localhost\r\n\r\n")
+                await writer.drain()
+                response = await reader.read()
+                writer.close()
+
+            return response
+
+        response = asyncio.run(roundtrip())
+        header, body = response.split(b"\r\n\r\n", 1)
+
+        self.assertTrue(header.startswith(b"HTTP/1.1 200 OK"))
+        self.assertTrue(all(record["TIME_PERIOD"] >= 2020 for record in json.loads(body)))
+
+
+def synthetic_analysis(plot_dir: str) -> Analysis:
+    '''
+    Analysis on a small synthetic GeoDataFrame instead of the Natural Earth geodata, which is not downloaded
+    in the tests. Four countries on a grid of unit squares share their borders, "A" has a hole and "D" is a
+    multipolygon with an island. "A" and "B" share a jagged border, that is simplified differently when
+    every country is simplified on its own.
+    '''
+    offsets = np.random.default_rng(3).uniform(-0.08, 0.08, 41)
+    offsets[[0, -1]] = 0
+    border = [(1 + offset, idx / 40) for idx, offset in enumerate(offsets)]
+    geometries = {
+        "A": Polygon([(0, 0)] + border + [(0, 1)], [box(0.4, 0.4, 0.6, 0.6).exterior.coords]),
+        "B": Polygon(border[::-1] + [(2, 0), (2, 1)]),
+        "C": box(0, 1, 1, 2),
+        "D": MultiPolygon([box(1, 1, 2, 2), box(2.5, 0, 3, 0.5)]),
+    }
+    years = list(range(2000, 2005))
+
+    rows = [
+        {"COUNTRY": country, "TIME_PERIOD": year, "CHANGE_INDICATOR": idx + 0.1 * step,
+         "MTOE": 10.0 * idx + step, "TOE_HAB": 1.0 + idx, "geometry": geometry}
+        for idx, (country, geometry) in enumerate(geometries.items())
+        for step, year in enumerate(years)
+    ]
+
+    analysis = Analysis.__new__(Analysis)
+    analysis.europe = gpd.GeoDataFrame(rows, geometry="geometry")
+    analysis.PLOT_ROOT_DIR = plot_dir
+    analysis.column_name_to_title_description = {
+        "CHANGE_INDICATOR": "Temperature Change Indicator (℃)",
+        "TOE_HAB": "Tonnes of Oil Equivalents per capita",
+        "MTOE": "Million Tonnes of Oil Equivalent per GDP",
+    }
+
+    return analysis
+
+
+class TestAnalysis(unittest.TestCase):
+    '''
+    test_country_lines: Tests that the long frame is pivoted into one line per country.
+    test_geometry_to_path: Tests that holes and multipolygons are kept in the matplotlib paths.
+    test_small_multiples: Tests the pages of small multiples and that the context shows all countries.
+    test_map_strip: Tests that one map per year is drawn and that unknown years are rejected.
+    test_level_of_detail: Tests that the simplification tolerance follows the size of the axes in pixels.
+    test_coverage_simplification: Tests that neighbouring countries share their simplified border.
+    test_map_plot: Tests that a map for a single year is saved and that invalid years are rejected.
+    test_map_plots: Tests the batch of maps for several columns and years and that empty or unknown selections are rejected.
+    '''
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.analysis = synthetic_analysis(self.tmp_dir)
+
+
+    def tearDown(self):
+        plt.close("all")
+        shutil.rmtree(self.tmp_dir)
+
+
+    def test_country_lines(self):
+        names, segments = self.analysis._country_lines("MTOE")
+
+        self.assertEqual(names, ["A", "B", "C", "D"])
+        self.assertEqual(segments.shape, (4, 5, 2))
+        np.testing.assert_array_equal(segments[1, :, 0], np.arange(2000, 2005))
+        np.testing.assert_array_equal(segments[1, :, 1], [10, 11, 12, 13, 14])
+
+        names, segments = self.analysis._country_lines("MTOE", countries=["C", "A"])
+        self.assertEqual(names, ["C", "A"])
+        self.assertEqual(segments[0, 0, 1], 20)
+
+        with self.assertRaises(ValueError):
+            self.analysis._country_lines("MTOE", countries=["ZZ"])
+
+
+    @staticmethod
+    def _filled(path, points) -> list:
+        # Renders the path in black on a 3x2 canvas with 100 pixels per unit and reads the given points
+        fig = plt.figure(figsize=(3, 2), dpi=100)
+        ax = fig.add_axes([0, 0, 1, 1])
+        ax.set_axis_off()
+        ax.set_xlim(0, 3)
+        ax.set_ylim(0, 2)
+        ax.add_collection(PathCollection([path], facecolors="black", edgecolors="none"))
+
+        fig.canvas.draw()
+        image = np.asarray(fig.canvas.buffer_rgba())
+        plt.close(fig)
+
+        return [image[199 - int(y * 100), int(x * 100), 0] == 0 for x, y in points]
+
+
+    def test_geometry_to_path(self):
+        geometries = self.analysis.europe.drop_duplicates("COUNTRY").set_index("COUNTRY").geometry
+
+        with_hole = Analysis._geometry_to_path(geometries["A"])
+        self.assertEqual((with_hole.codes == with_hole.MOVETO).sum(), 2)
+        self.assertEqual(self._filled(with_hole, [(0.2, 0.2), (0.5, 0.5)]), [True, False])
+
+        multipolygon = Analysis._geometry_to_path(geometries["D"])
+        self.assertEqual((multipolygon.codes == multipolygon.MOVETO).sum(), 2)
+        self.assertEqual(self._filled(multipolygon, [(1.5, 1.5), (2.75, 0.25), (2.25, 0.25)]), [True, True, False])
+
+
+    def test_small_multiples(self):
+        paths = self.analysis.create_small_multiples("MTOE", nrows=1, ncols=3)
+
+        self.assertEqual([os.path.basename(path) for path in paths], ["MTOE_small_multiples_1.png", "MTOE_small_multiples_2.png"])
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+        with mock.patch.object(self.analysis, "_render_line_background", wraps=Analysis._render_line_background) as render:
+            paths = self.analysis.create_small_multiples("MTOE", countries=["B"])
+
+        self.assertEqual(len(paths), 1)
+        self.assertEqual(render.call_args.args[0].shape[0], 4)
+
+        with self.assertRaises(ValueError):
+            self.analysis.create_small_multiples("MTOE", countries=[])
+
+
+    def test_map_strip(self):
+        path = self.analysis.create_map_strip("CHANGE_INDICATOR", years=[2000, 2002, 2004], ncols=2)
+
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(plt.imread(path).shape[1], 2 * 4 * plt.rcParams["figure.dpi"])
+
+        with self.assertRaises(ValueError):
+            self.analysis.create_map_strip("CHANGE_INDICATOR", years=[1990])
+
+
+    def test_level_of_detail(self):
+        # About 15 pixels for 3 degrees at the small size, 1500 pixels at the size of create_map_plot
+        _, small = plt.subplots(figsize=(1, 1), dpi=20)
+        _, large = plt.subplots(figsize=(20, 10), dpi=100)
+
+        with mock.patch.object(Analysis, "COVERAGE_SIMPLIFY", True):
+            self.assertEqual(self.analysis._choose_tolerance(small), 0.1)
+            self.assertEqual(self.analysis._choose_tolerance(large), 0.0)
+
+        # Simplified per country, the tolerance is halved so that slivers stay below one pixel
+        with mock.patch.object(Analysis, "COVERAGE_SIMPLIFY", False):
+            self.assertEqual(self.analysis._choose_tolerance(small), 0.05)
+
+        names, paths = self.analysis._country_paths(0.1)
+        self.assertEqual(names, ["A", "B", "C", "D"])
+        self.assertTrue(len(paths[0].vertices) < len(self.analysis._country_paths(0.0)[1][0].vertices))
+
+
+    @unittest.skipUnless(Analysis.COVERAGE_SIMPLIFY, "coverage simplification requires shapely >= 2.1")
+    def test_coverage_simplification(self):
+        original = self.analysis._simplified_geometries(0.0)
+        simplified = self.analysis._simplified_geometries(0.05)
+        a, b = simplified.iloc[0], simplified.iloc[1]
+
+        # No overlaps and no gaps along the shared border
+        self.assertTrue(len(a.exterior.coords) < len(original.iloc[0].exterior.coords))
+        self.assertAlmostEqual(a.intersection(b).area, 0.0)
+        self.assertAlmostEqual(a.union(b).area, original.iloc[0].union(original.iloc[1]).area)
+
+
+    def test_map_plot(self):
+        self.analysis.create_map_plot("MTOE", average=False, year=2002)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, "MTOE_map.png")))
+
+        with self.assertRaises(ValueError):
+            self.analysis.create_map_plot("MTOE", average=False, year=1990)
+        with self.assertRaises(ValueError):
+            self.analysis.create_map_plot("MTOE", average=True, year=2002)
+
+
+    def test_map_plots(self):
+        paths = self.analysis.create_map_plots(["MTOE", "TOE_HAB"], average=False, years=[2000, 2004])
+
+        self.assertEqual(
+            [os.path.basename(path) for path in paths],
+            ["MTOE_2000_map.png", "MTOE_2004_map.png", "TOE_HAB_2000_map.png", "TOE_HAB_2004_map.png"])
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+        self.assertEqual([os.path.basename(path) for path in self.analysis.create_map_plots(["MTOE"])], ["MTOE_map.png"])
+
+        with self.assertRaises(ValueError):
+            self.analysis.create_map_plots(["MTOE"], average=True, years=[2000])
+        with self.assertRaises(ValueError):
+            self.analysis.create_map_plots(["MTOE"], average=False, years=[2000, 1990])
+        with self.assertRaises(ValueError):
+            self.analysis.create_map_plots([])
+        with self.assertRaises(ValueError):
+            self.analysis.create_map_plots(["MTOE"], average=False, years=[])
+
+        # Nothing is written if a later column is unknown
+        with self.assertRaises(ValueError):
+            self.analysis.create_map_plots(["TOE_HAB", "UNKNOWN"], average=False, years=[2001])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, "TOE_HAB_2001_map.png")))
 
+        # The values only need the country names, not the simplified geometries
+        with mock.patch.object(Analysis, "_country_paths") as country_paths:
+            values, _ = self.analysis._map_plot_values("MTOE", average=True)
+        country_paths.assert_not_called()
+        self.assertEqual(len(values), 4)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,318 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from preprocessing import DataPreprocesser
+from stages import file_hash
+
+
+class ValidationReport:
+    '''
+    Result of the validation of the raw inputs. Errors make the pipeline stop before preprocessing,
+    warnings describe data that preprocessing will handle (e.g. countries that will be removed).
+    The stats are stored with the report, so that later stages can rely on them.
+    inputs: sha256 of the validated files, the report only holds for files with the same content.
+    '''
+    def __init__(self) -> None:
+        self.errors = []
+        self.warnings = []
+        self.stats = {}
+        self.inputs = {}
+
+    @property
+    def valid(self) -> bool:
+        return len(self.errors) == 0
+
+    def merge(self, other: "ValidationReport", name: str) -> None:
+        self.errors.extend(f"{name}: {error}" for error in other.errors)
+        self.warnings.extend(f"{name}: {warning}" for warning in other.warnings)
+        self.stats[name] = other.stats
+
+    def to_dict(self) -> dict:
+        return {
+            "valid": self.valid,
+            "errors": self.errors,
+            "warnings": self.warnings,
+            "stats": self.stats,
+            "inputs": self.inputs
+            }
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2, default=str)
+
+    @staticmethod
+    def load(path: str) -> dict:
+        with open(path) as file:
+            return json.load(file)
+
+    @staticmethod
+    def valid_for(path: str, inputs: List[str]) -> bool:
+        # A saved report only counts if it passed and the inputs did not change since
+        if not os.path.exists(path):
+            return False
+
+        report = ValidationReport.load(path)
+        return report["valid"] and report.get("inputs") == {fpath: file_hash(fpath) for fpath in inputs}
+
+    def raise_for_errors(self) -> None:
+        if not self.valid:
+            raise ValueError("Validation of the raw data failed:\n" + "\n".join(self.errors))
+
+
+def missing_runs(missing: np.ndarray) -> Dict[str, int]:
+    # Longest run of consecutive missing years and the run at the beginning, which cannot be interpolated
+    longest, current = 0, 0
+    for is_missing in missing:
+        current = current + 1 if is_missing else 0
+        longest = max(longest, current)
+
+    leading = int(np.argmin(missing)) if not missing.all() else len(missing)
+
+    return {"missing": int(missing.sum()), "longest_missing_run": longest, "leading_missing": leading}
+
+
+class DataValidator:
+    '''
+    Scans the raw Kaggle and Eurostat files in chunks, both files in parallel, and checks
+    schema, dtypes, geo codes, duplicate keys, observation flags and missing values per country.
+    '''
+    EUROSTAT_COLUMNS = ["unit", "geo", "TIME_PERIOD", "OBS_VALUE", "OBS_FLAG"]
+    KAGGLE_COLUMNS = ["ISO2", "Country"]
+
+    # Eurostat observation flags, combinations like "bep" are allowed
+    EUROSTAT_FLAGS = set("bcdefnprsuz")
+
+    def __init__(
+            self,
+            kaggle_fpath: str,
+            eurostat_fpath: str,
+            eurostat_units: List[str] = None,
+            chunksize: int = 100_000,
+            max_missing: int = 10
+            ) -> None:
+
+        self.kaggle_fpath = kaggle_fpath
+        self.eurostat_fpath = eurostat_fpath
+        self.chunksize = chunksize
+        self.max_missing = max_missing
+
+        # Same country codes and units as used in preprocessing
+        preprocessor = DataPreprocesser(kaggle_fpath, eurostat_fpath, eurostat_units=eurostat_units)
+        self.code_mapping = preprocessor.code_mapping
+        self.european_countries_iso2 = preprocessor.european_countries_iso2
+        self.eurostat_units = preprocessor.eurostat_units
+
+
+    def _check_missing(self, report: ValidationReport, series: Dict[str, np.ndarray], label: str) -> None:
+        runs = {key: missing_runs(missing) for key, missing in series.items()}
+        report.stats["missing_runs"] = runs
+
+        leading = sorted(key for key, run in runs.items() if run["leading_missing"] > 0)
+        too_many = sorted(key for key, run in runs.items() if run["missing"] > self.max_missing)
+
+        if leading:
+            report.warnings.append(f"{label} with missing values at the beginning (cannot be interpolated): {leading}")
+        if too_many:
+            report.warnings.append(f"{label} with more than {self.max_missing} missing values: {too_many}")
+
+
+    def validate_eurostat(self) -> ValidationReport:
+        report = ValidationReport()
+
+        header = pd.read_csv(self.eurostat_fpath, nrows=0).columns
+        missing_columns = [col for col in self.EUROSTAT_COLUMNS if col not in header]
+        if missing_columns:
+            report.errors.append(f"Missing columns {missing_columns}")
+            return report
+
+        n_rows = 0
+        unknown_codes = set()
+        invalid_flags = set()
+        flag_counts = {}
+
+        '''
+        Only the hashes of the (geo, TIME_PERIOD, unit) keys and, per series, the years with a value
+        are kept across chunks, not the rows themselves. Duplicates are detected against the keys
+        of the previous chunks as the file is scanned.
+        '''
+        seen_keys = set()
+        duplicates = []
+        units = set()
+        countries = set()
+        unit_years = {}
+        observed = {}
+
+        for chunk in pd.read_csv(
+                self.eurostat_fpath, usecols=self.EUROSTAT_COLUMNS, chunksize=self.chunksize,
+                dtype={"unit": str, "geo": str, "OBS_FLAG": str}):
+
+            n_rows += len(chunk)
+
+            years = pd.to_numeric(chunk["TIME_PERIOD"], errors="coerce")
+            if years.isna().any() or (years % 1 != 0).any():
+                report.errors.append(f"Non-integer TIME_PERIOD values: {chunk.loc[years.isna() | (years % 1 != 0), 'TIME_PERIOD'].unique()[:5].tolist()}")
+
+            values = pd.to_numeric(chunk["OBS_VALUE"], errors="coerce")
+            non_numeric = chunk["OBS_VALUE"].notna() & values.isna()
+            if non_numeric.any():
+                report.errors.append(f"Non-numeric OBS_VALUE values: {chunk.loc[non_numeric, 'OBS_VALUE'].unique()[:5].tolist()}")
+
+            for flag, count in chunk["OBS_FLAG"].dropna().value_counts().items():
+                flag_counts[flag] = flag_counts.get(flag, 0) + int(count)
+                if not set(flag) <= self.EUROSTAT_FLAGS:
+                    invalid_flags.add(flag)
+
+            selected = chunk["unit"].isin(self.eurostat_units)
+            unknown_codes.update(chunk.loc[selected & ~chunk["geo"].isin(self.code_mapping.keys()), "geo"].unique())
+
+            keys = pd.DataFrame({"geo": chunk.loc[selected, "geo"], "TIME_PERIOD": years[selected], "unit": chunk.loc[selected, "unit"]})
+            units.update(keys["unit"].unique())
+            countries.update(keys["geo"].unique())
+
+            hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+            duplicated = pd.Series(hashes).duplicated().to_numpy() | np.array([key in seen_keys for key in hashes.tolist()], dtype=bool)
+            seen_keys.update(hashes.tolist())
+
+            for key in keys[duplicated].values.tolist():
+                if key not in duplicates and len(duplicates) < 5:
+                    duplicates.append(key)
+
+            # Years with a value per (unit, geo) series, absent years are counted as missing at the end
+            series_rows = keys[keys["TIME_PERIOD"].notna()].assign(has_value=values[selected].notna())
+            for (unit, geo), group in series_rows.groupby(["unit", "geo"]):
+                unit_years.setdefault(unit, set()).update(group["TIME_PERIOD"].astype(int))
+                observed.setdefault((unit, geo), set()).update(group.loc[group["has_value"], "TIME_PERIOD"].astype(int))
+
+        if unknown_codes:
+            report.errors.append(f"Unknown geo codes: {sorted(unknown_codes)}")
+        if invalid_flags:
+            report.errors.append(f"Unknown OBS_FLAG values: {sorted(invalid_flags)}")
+        if duplicates:
+            report.errors.append(f"Duplicate (geo, TIME_PERIOD, unit) keys: {duplicates}")
+
+        missing_units = [unit for unit in self.eurostat_units if unit not in units]
+        if missing_units:
+            report.errors.append(f"No values for units {missing_units}")
+
+        '''
+        Absent years count as missing as well, over the years reported for the unit.
+        The series get the same keys as the country columns after preprocessing (unit/geo).
+        '''
+        series = {}
+        for (unit, geo), years_with_value in sorted(observed.items()):
+            series[f"{unit}/{geo}"] = np.array([year not in years_with_value for year in sorted(unit_years[unit])])
+
+        self._check_missing(report, series, "Eurostat series")
+
+        # Without any numeric TIME_PERIOD there is no year range, the error is already reported
+        all_years = set().union(*unit_years.values())
+        report.stats.update({
+            "rows": n_rows,
+            "units": sorted(units),
+            "countries": sorted(countries),
+            "years": [min(all_years), max(all_years)] if all_years else [],
+            "flags": flag_counts,
+        })
+
+        return report
+
+
+    def _scan_kaggle(self) -> Tuple[ValidationReport, Dict[str, np.ndarray], np.ndarray]:
+        report = ValidationReport()
+        series = {}
+
+        header = pd.read_csv(self.kaggle_fpath, nrows=0).columns
+        missing_columns = [col for col in self.KAGGLE_COLUMNS if col not in header]
+        year_columns = [col for col in header if col.startswith("F") and col[1:].isdigit()]
+
+        if missing_columns:
+            report.errors.append(f"Missing columns {missing_columns}")
+        if not year_columns:
+            report.errors.append("No year columns (F<year>) found")
+        if not report.valid:
+            return report, series, np.array([], dtype=int)
+
+        n_rows = 0
+        countries = []
+
+        # keep_default_na=False, since "NA" is the ISO2 code of Namibia
+        for chunk in pd.read_csv(
+                self.kaggle_fpath, usecols=self.KAGGLE_COLUMNS + year_columns, chunksize=self.chunksize,
+                dtype={"ISO2": str}, keep_default_na=False, na_values={col: ["", "NA", "NaN"] for col in year_columns}):
+
+            n_rows += len(chunk)
+            countries.extend(chunk["ISO2"].tolist())
+
+            values = chunk[year_columns].apply(pd.to_numeric, errors="coerce")
+            non_numeric = chunk[year_columns].notna() & values.isna()
+            if non_numeric.any().any():
+                report.errors.append(f"Non-numeric values in year columns {non_numeric.columns[non_numeric.any()].tolist()[:5]}")
+
+            european = chunk["ISO2"].isin(self.european_countries_iso2).to_numpy()
+            for iso2, missing in zip(chunk["ISO2"][european], values[european].isna().to_numpy()):
+                series[iso2] = missing
+
+        countries = pd.Series(countries)
+        duplicated = countries[countries.duplicated() & (countries != "")].unique().tolist()
+        if duplicated:
+            report.errors.append(f"Duplicate ISO2 codes: {duplicated}")
+
+        years = np.array([int(col[1:]) for col in year_columns])
+        report.stats.update({
+            "rows": n_rows,
+            "countries": sorted(series),
+            "years": [int(years.min()), int(years.max())],
+        })
+
+        return report, series, years
+
+
+    def _check_kaggle_missing(
+            self,
+            report: ValidationReport,
+            series: Dict[str, np.ndarray],
+            years: np.ndarray,
+            min_year: int = None
+            ) -> None:
+
+        # Only the years that are kept in preprocessing are relevant for interpolation
+        if min_year is not None:
+            series = {key: missing[years >= min_year] for key, missing in series.items()}
+        self._check_missing(report, series, "Kaggle countries")
+
+
+    def validate_kaggle(self, min_year: int = None) -> ValidationReport:
+        report, series, years = self._scan_kaggle()
+        self._check_kaggle_missing(report, series, years, min_year)
+        return report
+
+
+    def validate(self) -> ValidationReport:
+        report = ValidationReport()
+        report.inputs = {fpath: file_hash(fpath) for fpath in [self.kaggle_fpath, self.eurostat_fpath]}
+
+        # Both files are scanned in parallel
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            kaggle = executor.submit(self._scan_kaggle)
+            eurostat = executor.submit(self.validate_eurostat)
+
+            kaggle_report, kaggle_series, kaggle_years = kaggle.result()
+            eurostat_report = eurostat.result()
+
+        # Like in preprocessing, the Kaggle data is only used from the first Eurostat year on
+        eurostat_years = eurostat_report.stats.get("years")
+        min_year = eurostat_years[0] if eurostat_years else None
+        self._check_kaggle_missing(kaggle_report, kaggle_series, kaggle_years, min_year)
+
+        report.merge(kaggle_report, os.path.basename(self.kaggle_fpath))
+        report.merge(eurostat_report, os.path.basename(self.eurostat_fpath))
+
+        for warning in report.warnings:
+            print("Validation warning: ", warning)
+
+        return report